@@ -0,0 +1,74 @@
+import os
+import copy
+import json
+
+
+# Column mappings written on first start, one entry per payment app
+DEFAULT_CONFIG = {
+    'easemytrip': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
+    'nammayathri': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'Total Amount', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
+    'phonepe': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
+    'paytm': {'id_col': 'Operator Reference Number', 'match_col': 'order_id', 'amount_col': 'Total Price', 'settle_col': 'Payable Amount', 'date_col': 'Settlement Date'},
+    'rapido': {'id_col': 'Network Order ID', 'match_col': 'transaction_ref_no', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
+    'redbus': {'id_col': 'Network Order ID(From ondcTxnId)', 'match_col': 'transaction_ref_no', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'}
+}
+
+# Bank statement keywords per app, matched case-insensitively against
+# "Transaction Particulars". An app's entry in config.json may override them
+# with a "bank_keywords" list; apps are tried in this order, then any others
+# in config order, and the first app with a matching keyword wins.
+DEFAULT_BANK_KEYWORDS = {
+    'nammayathri': ['moving tech innovations', 'ypp limit neft'],
+    'redbus': ['redbus'],
+    'rapido': ['roppen'],
+    'paytm': ['paytm', 'pai platforms'],
+    'easemytrip': ['easytrip'],
+    'phonepe': ['922020004688715', 'phonepe'],
+}
+
+# Whether the GUI and command line archive results unless told otherwise;
+# here rather than in results_archive so the GUI can read it without pandas
+ARCHIVE_RESULTS = os.getenv("KOCHIMETRO_ARCHIVE_RESULTS", "0") == "1"
+
+
+def app_folder():
+    """Per-user data folder: %APPDATA%\\kochimetro on Windows, ~/.config/kochimetro elsewhere."""
+    appdata_dir = os.getenv("APPDATA") if os.name == "nt" else os.path.expanduser("~/.config")
+    return os.path.join(appdata_dir, "kochimetro")
+
+
+def config_file_path():
+    return os.path.join(app_folder(), "config.json")
+
+
+def load_config(config_path=None):
+    """
+    Load the app column mappings, writing DEFAULT_CONFIG to config_path first
+    if the file does not exist yet.
+    """
+    config_path = config_path or config_file_path()
+    if os.path.exists(config_path):
+        with open(config_path, "r") as file:
+            return json.load(file)
+
+    os.makedirs(os.path.dirname(config_path), exist_ok=True)
+    with open(config_path, "w") as file:
+        json.dump(DEFAULT_CONFIG, file, indent=4)
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def save_date_formats(formats, config_path=None):
+    """
+    Cache the settlement date formats found for apps ({app: format}) as the
+    date_format of their mappings, so the next run tries them first.
+    """
+    config_path = config_path or config_file_path()
+    config = load_config(config_path)
+    changed = {app_name: date_format for app_name, date_format in formats.items()
+               if app_name in config and config[app_name].get('date_format') != date_format}
+    if not changed:
+        return
+    for app_name, date_format in changed.items():
+        config[app_name]['date_format'] = date_format
+    with open(config_path, "w") as file:
+        json.dump(config, file, indent=4)
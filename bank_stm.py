@@ -1,12 +1,13 @@
-import pandas as pd
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, 
     QFileDialog, QMessageBox, QTableView
 )
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QStandardItemModel, QStandardItem
 import os
 from loading_overlay import LoadingOverlay
+from dataframe_model import DataFrameModel
+from workers import Worker, start_job
+from jobs import read_preview, process_bank_statement
 
 
 class BankStatementProcessor(QWidget):
@@ -80,9 +81,6 @@ class BankStatementProcessor(QWidget):
             self, "Select Bank Statement", "", "Excel Files (*.xlsx)"
         )
         if self.bank_statement_path:
-            # Show loading overlay before starting the upload
-            self.loading_overlay.start_loading("Uploading bank statement...")
-            
             # Update the label text
             self.bank_statement_label.setText(
                 f"Selected: {os.path.basename(self.bank_statement_path)}"
@@ -94,103 +92,69 @@ class BankStatementProcessor(QWidget):
     def load_table(self, file_path):
         # Disable the process button
         self.process_button.setEnabled(False)
-        
+
+        worker = Worker(read_preview, file_path)
+        worker.signals.result.connect(lambda df: self.table_view.setModel(DataFrameModel(df)))
+        worker.signals.error.connect(self._on_load_error)
+        worker.signals.finished.connect(self._on_job_done)
+
         # Show loading overlay
-        self.loading_overlay.start_loading("Loading bank statement...")
+        self.loading_overlay.start_loading("Loading bank statement...", job=worker)
+        start_job(worker)
 
-        try:
-            df = pd.read_excel(file_path)
-            self.loading_overlay.set_progress(50)
-            
-            model = QStandardItemModel()
-            
-            # Set headers
-            model.setHorizontalHeaderLabels(df.columns.tolist())
-            
-            # Populate data
-            for row in df.itertuples(index=False):
-                items = [QStandardItem(str(value)) for value in row]
-                model.appendRow(items)
-            
-            self.table_view.setModel(model)
-            self.loading_overlay.set_progress(100)
-            
-            # Stop loading overlay before completion
-            self.loading_overlay.stop_loading()
-            
-        except Exception as e:
-            # Stop loading before showing error message
-            self.loading_overlay.stop_loading()
-            QMessageBox.critical(self, "Error", f"Error loading file:\n{str(e)}")
-        
-        finally:
-            # Re-enable the process button
-            self.process_button.setEnabled(True)
+    def _on_load_error(self, message):
+        # Stop loading before showing error message
+        self.loading_overlay.stop_loading()
+        QMessageBox.critical(self, "Error", f"Error loading file:\n{message}")
 
     def process_statement(self):
         if not self.bank_statement_path:
             QMessageBox.warning(self, "Error", "Please upload a bank statement first.")
             return
 
+        # Ask where to save before processing starts
+        save_path, _ = QFileDialog.getSaveFileName(
+            self, "Save Processed Bank Statement", "", "Excel Files (*.xlsx)"
+        )
+        if not save_path:
+            QMessageBox.information(self, "Canceled", "Save operation was canceled.")
+            return
+        if not save_path.endswith(".xlsx"):
+            save_path += ".xlsx"
+
         # Disable the process button
         self.process_button.setEnabled(False)
-        
+
+        worker = Worker(process_bank_statement, self.bank_statement_path, save_path)
+        worker.signals.result.connect(self._on_process_finished)
+        worker.signals.error.connect(self._on_process_error)
+        worker.signals.cancelled.connect(self._on_process_cancelled)
+        worker.signals.finished.connect(self._on_job_done)
+
         # Show loading overlay
-        self.loading_overlay.start_loading("Processing bank statement...")
+        self.loading_overlay.start_loading("Processing bank statement...", job=worker)
+        start_job(worker)
+
+    def _on_process_finished(self, result):
+        save_path, stats = result
+        # Stop loading before showing success message
+        self.loading_overlay.stop_loading()
+        QMessageBox.information(
+            self, "Success",
+            f"Processed data saved to:\n{save_path}\n\n"
+            f"Unknown app for {stats.unknown} of {stats.total} transactions ({stats.unknown_rate:.1%})"
+        )
 
-        try:
-            # Read and process bank statement
-            bank_statement = pd.read_excel(self.bank_statement_path)
-            self.loading_overlay.set_progress(30)
-            
-            # Add app column based on transaction particulars
-            bank_statement['app'] = bank_statement['Transaction Particulars'].apply(self._get_bank_statement_app)
-            bank_statement['Tran Date'] = pd.to_datetime(bank_statement['Tran Date']).dt.strftime('%Y-%m-%d')
-            self.loading_overlay.set_progress(60)
-            
-            # Group by app and date
-            bank_amounts = bank_statement.groupby(['app', 'Tran Date'])['Amount(INR)'].sum().reset_index()
-            self.loading_overlay.set_progress(80)
+    def _on_process_error(self, message):
+        # Stop loading before showing error message
+        self.loading_overlay.stop_loading()
+        QMessageBox.critical(self, "Error", f"Error processing file:\n{message}")
 
-            # Save the processed data
-            save_path, _ = QFileDialog.getSaveFileName(
-                self, "Save Processed Bank Statement", "", "Excel Files (*.xlsx)"
-            )
-            if save_path:
-                if not save_path.endswith(".xlsx"):
-                    save_path += ".xlsx"
-                
-                bank_amounts.to_excel(save_path, sheet_name="Bank Amounts", index=False)
-                
-                # Stop loading before showing success message
-                self.loading_overlay.stop_loading()
-                QMessageBox.information(self, "Success", f"Processed data saved to:\n{save_path}")
-            else:
-                # Stop loading before showing canceled message
-                self.loading_overlay.stop_loading()
-                QMessageBox.information(self, "Canceled", "Save operation was canceled.")
-            
-        except Exception as e:
-            # Stop loading before showing error message
-            self.loading_overlay.stop_loading()
-            QMessageBox.critical(self, "Error", f"Error processing file:\n{str(e)}")
-        
-        finally:
-            # Re-enable the process button
-            self.process_button.setEnabled(True)
-
-    def _get_bank_statement_app(self, transaction_particulars):
-        particulars = str(transaction_particulars).lower()
-        if "moving tech innovations" in particulars or "ypp limit neft" in particulars:
-            return "nammayathri"
-        elif "redbus" in particulars:
-            return "redbus"
-        elif "roppen" in particulars:
-            return "rapido"
-        elif "paytm" in particulars or "pai platforms" in particulars:
-            return "paytm"
-        elif "easytrip" in particulars:
-            return "easemytrip"
-        elif "922020004688715" in particulars or "phonepe" in particulars:
-            return "phonepe"
-        return "unknown"
+    def _on_process_cancelled(self):
+        self.loading_overlay.stop_loading()
+        QMessageBox.information(self, "Canceled", "Processing was canceled.")
+
+    def _on_job_done(self):
+        self.loading_overlay.stop_loading()
+        # Re-enable the process button
+        self.process_button.setEnabled(True)
@@ -0,0 +1,459 @@
+"""
+Benchmark the compare, settlement and bank statement pipelines on
+synthetic workbooks:
+
+    python -m benchmark                              # 10k, 100k and 1M rows
+    python -m benchmark --rows 10000 100000 -o bench.json
+    python -m benchmark --baseline last_release.json
+
+The inputs are generated from the default column mappings in app_config
+and written as real .xlsx files, so the numbers include parsing. Every
+pipeline runs with the workbook cache cleared and sidecars disabled. The
+report lists, per size and pipeline, the time of each progress stage
+(read, aggregate, merge, classify, write, ...) and the peak memory during
+it: the process's resident set size sampled every few milliseconds, or
+with --tracemalloc the Python allocations traced by tracemalloc (exact,
+but it slows the openpyxl stages down several times over).
+
+Writing the 1M-row inputs takes several minutes; pass --data-dir to keep
+them for the next run.
+
+With --baseline the totals are compared against an earlier report and the
+exit status is 1 when a pipeline got slower than --tolerance allows.
+"""
+import argparse
+import copy
+import ctypes
+import datetime
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from app_config import DEFAULT_BANK_KEYWORDS, DEFAULT_CONFIG
+from excel_reader import EXCEL_ENGINE
+from xlsx_export import SheetSpec, write_workbook
+from workbook_cache import clear_cache
+from sidecar_cache import sidecar_cache
+from compare_pipeline import compare_files
+from settlement_pipeline import Process, build_all_outputs
+from bank_pipeline import process_bank_statement
+from cli import ConsoleJob
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+PIPELINES = ["compare", "settlement", "bank"]
+
+# AFC exports spell the app the way the ticketing system does
+AFC_APP_NAMES = {'nammayathri': 'yathri'}
+STATIONS = ['Aluva', 'Pulinchodu', 'Companypady', 'Ambattukavu', 'Muttom', 'Kalamassery',
+            'Edappally', 'Palarivattom', 'JLN Stadium', 'Kaloor', 'MG Road', 'Maharajas',
+            'Ernakulam South', 'Kadavanthra', 'Vyttila', 'Thaikoodam', 'Petta', 'SN Junction']
+DATE_RANGE_DAYS = 30
+
+
+def generate_afc(rows, rng, apps):
+    """
+    AFC export with `rows` rows: mostly one row per ticket, a few tickets
+    split over two rows and about 5% refunds.
+    """
+    tickets = rows - rows // 50
+    ticket_numbers = np.array([f"T{i:09d}" for i in range(tickets)], dtype=object)
+    # 2% of the tickets get a second row, e.g. a fare adjustment
+    ticket_rows = np.concatenate([np.arange(tickets), rng.choice(tickets, rows - tickets, replace=False)])
+    afc_apps = np.array([AFC_APP_NAMES.get(app, app) for app in apps], dtype=object)
+    return pd.DataFrame({
+        'TicketNUmber': ticket_numbers[ticket_rows],
+        'QRCodePrice': rng.choice([10.0, 20.0, 30.0, 40.0, 50.0, 60.0], rows),
+        'QRCodeId': np.array([f"Q{i:010d}" for i in range(rows)], dtype=object),
+        'insertDT': _random_timestamps(rng, rows),
+        'FromStation': rng.choice(STATIONS, rows),
+        'To Station': rng.choice(STATIONS, rows),
+        'ONDCapp': afc_apps[rng.integers(0, len(afc_apps), tickets)][ticket_rows],
+        'descCode': rng.choice(['SJT', 'RJT', 'REFUND'], rows, p=[0.7, 0.25, 0.05]),
+    })
+
+
+def generate_triffy(afc, rng):
+    """
+    Triffy export for the same tickets: 97% of them, 2% with a different
+    amount, plus 1% bookings AFC does not have.
+    """
+    tickets = afc.groupby('TicketNUmber', sort=False)['QRCodePrice'].sum()
+    kept = tickets.sample(frac=0.97, random_state=rng.integers(2 ** 31))
+    amounts = kept.to_numpy().copy()
+    changed = rng.random(len(amounts)) < 0.02
+    amounts[changed] += 10.0
+
+    extra = max(len(tickets) // 100, 1)
+    ticket_numbers = np.concatenate([kept.index.to_numpy(dtype=object),
+                                     np.array([f"X{i:09d}" for i in range(extra)], dtype=object)])
+    rows = len(ticket_numbers)
+    return pd.DataFrame({
+        'ticket_number': ticket_numbers,
+        'total_amount': np.concatenate([amounts, rng.choice([20.0, 40.0], extra)]),
+        'transaction_ref_no': np.array([f"TR{i:010d}" for i in range(rows)], dtype=object),
+        'order_id': np.array([f"OD{i:010d}" for i in range(rows)], dtype=object),
+        'booking_status': rng.choice(['BOOKED', 'CANCELLED'], rows, p=[0.95, 0.05]),
+        'source': rng.choice(STATIONS, rows),
+        'destination': rng.choice(STATIONS, rows),
+        'booking_date': _random_timestamps(rng, rows),
+    })
+
+
+def generate_afc_triffi(afc, triffy):
+    """The reconciled AFC-triffi file the settlement pipeline starts from, one row per ticket."""
+    tickets = afc.drop_duplicates('TicketNUmber')[['TicketNUmber', 'insertDT', 'ONDCapp', 'QRCodePrice', 'descCode']]
+    merged = tickets.merge(triffy, left_on='TicketNUmber', right_on='ticket_number', how='inner')
+    return pd.DataFrame({
+        'insertDT': merged['insertDT'],
+        'TicketNUmber': merged['TicketNUmber'],
+        'order_id': merged['order_id'],
+        'transaction_ref_no': merged['transaction_ref_no'],
+        'ONDCapp': merged['ONDCapp'],
+        'total_amount': merged['total_amount'],
+        'QRCodePrice': merged['QRCodePrice'],
+        'booking_status': merged['booking_status'],
+        'descCode': merged['descCode'],
+        'Remark': np.where(merged['total_amount'] == merged['QRCodePrice'], 'AFC = Triffy', 'Misc'),
+    })
+
+
+def generate_settlements(afc_triffi, config, rng):
+    """
+    One settlement report per app in config, using its id/amount/settle/
+    date/comment columns: 98% of the app's tickets plus 0.5% the AFC side
+    does not know, with a few IDs repeated.
+    """
+    apps = afc_triffi['ONDCapp'].str.lower().replace('yathri', 'nammayathri')
+    settlements = {}
+    for app_name, mapping in config.items():
+        app_rows = afc_triffi[apps == app_name].sample(frac=0.98, random_state=rng.integers(2 ** 31))
+        extra = max(len(app_rows) // 200, 1)
+        ids = np.concatenate([app_rows[mapping['match_col']].to_numpy(dtype=object),
+                              np.array([f"S{app_name[:3].upper()}{i:08d}" for i in range(extra)], dtype=object)])
+        if app_name == 'paytm':
+            # Paytm reports truncate long reference numbers with "..."
+            ids = ids + "..."
+        amounts = np.concatenate([app_rows['QRCodePrice'].to_numpy(), rng.choice([20.0, 40.0], extra)])
+        dates = _random_timestamps(rng, len(ids))
+        if app_name == 'nammayathri':
+            dates = dates.strftime('%Y-%m-%d %H:%M:%S UTC')
+        else:
+            dates = dates.strftime('%d/%m/%Y %H:%M')
+
+        comment_col = mapping.get('comment_col', Process.FALLBACK_COMMENT_COLS.get(app_name, 'Ticket Status'))
+        settlement = pd.DataFrame({
+            mapping['id_col']: ids,
+            mapping['amount_col']: amounts,
+            mapping['settle_col']: np.round(amounts * 0.98, 2),
+            mapping['date_col']: dates,
+            comment_col: rng.choice(['SUCCESS', 'REFUNDED', 'PENDING'], len(ids), p=[0.9, 0.07, 0.03]),
+        })
+        repeated = settlement.sample(n=min(len(settlement), 3), random_state=rng.integers(2 ** 31))
+        settlements[app_name] = pd.concat([settlement, repeated], ignore_index=True)
+    return settlements
+
+
+def generate_bank_statement(rows, rng, keywords=DEFAULT_BANK_KEYWORDS):
+    """Bank statement credits; about 3% match no app keyword."""
+    particulars = [f"NEFT CR {keyword.upper()} SETTLEMENT" for app_keywords in keywords.values()
+                   for keyword in app_keywords]
+    particulars.append("NEFT CR UNRELATED PARTY")
+    weights = np.full(len(particulars), 0.97 / (len(particulars) - 1))
+    weights[-1] = 0.03
+    return pd.DataFrame({
+        'Tran Date': _random_timestamps(rng, rows),
+        'Transaction Particulars': rng.choice(particulars, rows, p=weights),
+        'Amount(INR)': rng.integers(100, 100_000, rows).astype(float),
+    })
+
+
+def generate_inputs(rows, data_dir, seed=0, config=DEFAULT_CONFIG):
+    """
+    Write the synthetic workbooks for one size into data_dir and return
+    their paths; workbooks already there from an earlier run are reused.
+    """
+    size_dir = os.path.join(data_dir, f"rows_{rows}_seed_{seed}")
+    index_path = os.path.join(size_dir, "inputs.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            return json.load(f)
+
+    os.makedirs(size_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    afc = generate_afc(rows, rng, list(config))
+    triffy = generate_triffy(afc, rng)
+    afc_triffi = generate_afc_triffi(afc, triffy)
+    settlements = generate_settlements(afc_triffi, config, rng)
+
+    def write(name, df):
+        path = os.path.join(size_dir, f"{name}.xlsx")
+        write_workbook(path, [SheetSpec("Sheet1", df)])
+        return path
+
+    inputs = {
+        "afc": write("afc", afc),
+        "triffy": write("triffy", triffy),
+        "afc_triffi": write("afc_triffi", afc_triffi),
+        "settlements": {app: write(f"{app}_settlement", df) for app, df in settlements.items()},
+        "bank": write("bank_statement", generate_bank_statement(rows, rng)),
+    }
+    with open(index_path, "w") as f:
+        json.dump(inputs, f, indent=2)
+    return inputs
+
+
+class RssSampler:
+    """Peak resident set size of this process, sampled from a background thread."""
+    source = "rss"
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._peak = _resident_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def peak_mb(self, reset=False):
+        peak = max(self._peak, _resident_bytes())
+        if reset:
+            self._peak = _resident_bytes()
+        return round(peak / (1024 * 1024), 1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _resident_bytes())
+
+
+class TracemallocTracker:
+    """Peak of the Python allocations made since start(), as traced by tracemalloc."""
+    source = "tracemalloc"
+
+    def start(self):
+        tracemalloc.start()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def peak_mb(self, reset=False):
+        _, peak = tracemalloc.get_traced_memory()
+        if reset:
+            tracemalloc.reset_peak()
+        return round(peak / (1024 * 1024), 1)
+
+
+class StageRecorder(logging.Handler):
+    """
+    Collects the stage spans ProgressReporter logs, with the memory peak
+    since the previous stage ended.
+    """
+    def __init__(self, memory=None):
+        super().__init__(logging.INFO)
+        self.memory = memory
+        self.stages = []
+
+    def emit(self, record):
+        if not hasattr(record, "span"):
+            return
+        stage = {"name": record.span, "seconds": round(record.elapsed, 4), **record.fields}
+        if self.memory is not None:
+            stage["peak_memory_mb"] = self.memory.peak_mb(reset=True)
+        self.stages.append(stage)
+
+
+@contextmanager
+def record_stages(memory=None):
+    """Route the progress stage spans into a StageRecorder instead of the console."""
+    logger = logging.getLogger("progress")
+    recorder = StageRecorder(memory)
+    saved = (logger.level, logger.propagate)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(recorder)
+    try:
+        yield recorder
+    finally:
+        logger.removeHandler(recorder)
+        logger.setLevel(saved[0])
+        logger.propagate = saved[1]
+
+
+def run_pipeline(name, inputs, output_dir, memory=None, config=DEFAULT_CONFIG):
+    """
+    Run one pipeline from cold caches; returns its timing record, with
+    memory peaks when a RssSampler or TracemallocTracker is given.
+    """
+    save_path = os.path.join(output_dir, f"{name}_output.xlsx")
+    job = ConsoleJob(name, quiet=True)
+    clear_cache()
+
+    if memory is not None:
+        memory.start()
+    started = time.perf_counter()
+    try:
+        with record_stages(memory) as recorder:
+            if name == "compare":
+                compare_files(inputs["afc"], inputs["triffy"], save_path, job)
+            elif name == "settlement":
+                build_all_outputs(inputs["afc_triffi"], inputs["settlements"], save_path, job,
+                                  config=copy.deepcopy(config))
+            elif name == "bank":
+                process_bank_statement(inputs["bank"], save_path, job, config=config)
+            else:
+                raise ValueError(f"Unknown pipeline: {name}")
+        result = {"pipeline": name, "seconds": round(time.perf_counter() - started, 4)}
+        if memory is not None:
+            result["peak_memory_mb"] = max([memory.peak_mb()] + [
+                stage["peak_memory_mb"] for stage in recorder.stages
+            ])
+        result["stages"] = recorder.stages
+        return result
+    finally:
+        if memory is not None:
+            memory.stop()
+        clear_cache()
+
+
+def run_benchmarks(rows_list, pipelines, data_dir, memory=None, seed=0):
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "excel_engine": EXCEL_ENGINE,
+        "platform": platform.platform(),
+        "memory_source": memory.source if memory is not None else None,
+        "runs": [],
+    }
+
+    # Sidecars would turn the read stages into cache loads
+    sidecar_budget = sidecar_cache.max_bytes
+    sidecar_cache.max_bytes = 0
+    try:
+        for rows in rows_list:
+            started = time.perf_counter()
+            inputs = generate_inputs(rows, data_dir, seed)
+            print(f"{rows} rows: inputs ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            with tempfile.TemporaryDirectory() as output_dir:
+                for name in pipelines:
+                    result = run_pipeline(name, inputs, output_dir, memory)
+                    report["runs"].append({"rows": rows, **result})
+                    peak = f", peak {result['peak_memory_mb']:.0f} MB" if memory is not None else ""
+                    print(f"{rows} rows: {name} {result['seconds']:.2f}s{peak}", file=sys.stderr)
+    finally:
+        sidecar_cache.max_bytes = sidecar_budget
+    return report
+
+
+def compare_reports(baseline, report, tolerance):
+    """
+    Return (rows, pipeline, baseline seconds, seconds) for every run that
+    is more than `tolerance` (a fraction) slower than in the baseline.
+    """
+    previous = {(run["rows"], run["pipeline"]): run["seconds"] for run in baseline["runs"]}
+    regressions = []
+    for run in report["runs"]:
+        before = previous.get((run["rows"], run["pipeline"]))
+        if before and run["seconds"] > before * (1 + tolerance):
+            regressions.append((run["rows"], run["pipeline"], before, run["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark the reconciliation pipelines")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="input sizes (default: 10k 100k 1M)")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES)
+    parser.add_argument("-o", "--output", default="benchmark_report.json", help="JSON report to write")
+    parser.add_argument("--data-dir", help="keep the generated workbooks here and reuse them on the next run")
+    parser.add_argument("--seed", type=int, default=0)
+    memory_group = parser.add_mutually_exclusive_group()
+    memory_group.add_argument("--tracemalloc", action="store_true",
+                              help="measure Python allocations instead of resident memory (much slower)")
+    memory_group.add_argument("--no-memory", action="store_true", help="do not measure memory")
+    parser.add_argument("--baseline", help="earlier report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+
+    if args.no_memory:
+        memory = None
+    elif args.tracemalloc or _resident_bytes() is None:
+        memory = TracemallocTracker()
+    else:
+        memory = RssSampler()
+
+    if args.data_dir:
+        report = run_benchmarks(args.rows, args.pipelines, args.data_dir, memory, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            report = run_benchmarks(args.rows, args.pipelines, data_dir, memory, args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        for rows, name, before, after in regressions:
+            print(f"Regression: {name} at {rows} rows took {after:.2f}s, baseline {before:.2f}s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+def _random_timestamps(rng, rows):
+    seconds = rng.integers(0, DATE_RANGE_DAYS * 24 * 3600, rows)
+    return pd.Timestamp('2024-10-01') + pd.to_timedelta(seconds, unit='s')
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ("cb", ctypes.c_ulong),
+        ("PageFaultCount", ctypes.c_ulong),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t),
+    ]
+
+
+def _resident_bytes():
+    """Current resident set size of this process; None where it cannot be read."""
+    if os.name == "nt":
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Helpers for the low-cardinality text columns (apps, stations, statuses,
+remarks) that the readers and pipelines keep as pandas categoricals.
+
+A categorical stores every distinct value once and one small integer code
+per row, so isin, ==, groupby and copies work on the codes instead of on
+Python strings. It only takes values from its categories, though: filling
+or masking with a new value needs the value added first, which
+with_categories does. Each helper also accepts plain object columns, as
+frames built from several pieces with different categories (concat) fall
+back to those.
+"""
+import numpy as np
+import pandas as pd
+
+
+def as_category(series):
+    """series as a categorical; left as it is unless it holds text (object dtype)."""
+    if series.dtype == object:
+        return series.astype('category')
+    return series
+
+
+def with_categories(series, *values):
+    """series with values added to its categories, so they can be filled in or masked with."""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    new = [value for value in values if value not in series.cat.categories]
+    return series.cat.add_categories(new) if new else series
+
+
+def map_values(series, func):
+    """
+    func applied to every non-missing value; on a categorical it runs once
+    per category and the result stays categorical, with categories func
+    made equal merged.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.map(func, na_action='ignore')
+    codes = series.cat.codes.to_numpy()
+    mapped = series.cat.categories.map(func)
+    try:
+        # Sorted like astype('category') sorts them, which groupby follows
+        new_codes, categories = pd.factorize(mapped, sort=True)
+    except TypeError:
+        # Numbers and text mixed have no order
+        new_codes, categories = pd.factorize(mapped)
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=series.index, name=series.name)
+
+
+def constant_category(value, length):
+    """A categorical of length rows all equal to value."""
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), [value])
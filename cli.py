@@ -0,0 +1,280 @@
+"""
+Headless entry point for the reconciliation pipelines, for scripted and
+overnight runs without the GUI:
+
+    python -m cli compare AFC.xlsx TRIFFY.xlsx -o errors.xlsx
+    python -m cli compare AFC.xlsx TRIFFY.xlsx -o errors.xlsx --streaming --partitions 64
+    python -m cli settlement AFC_TRIFFI.xlsx settlements/ -o settlement.xlsx --kind all
+    python -m cli settlement AFC_TRIFFI.xlsx settlements/ -o settlement.xlsx --workers 4
+    python -m cli settlement AFC_TRIFFI.xlsx settlements/ -o settlement.xlsx --incremental --archive
+    python -m cli history T000004743
+    python -m cli history --app paytm --from 2024-10-01 --to 2024-10-31
+    python -m cli bank statements/ -o bank_amounts/
+    python -m cli remove-rows reviewed/ --remove Option1 --remove Option2 -o cleaned/
+
+-v turns on debug tracing (data quality diagnostics, samples), -q keeps
+only warnings and errors; otherwise $KOCHIMETRO_LOG_LEVEL applies.
+
+Directories are expanded to the .xlsx files they contain. Commands that
+take several inputs write one output per input into the -o directory and
+keep going when one of them fails. Nothing here imports Qt.
+"""
+import argparse
+import logging
+import os
+import sys
+from progress import ProgressReporter
+from tracing import configure_logging
+from app_config import load_config, ARCHIVE_RESULTS
+from compare_pipeline import compare_files, compare_files_streaming, should_stream, STREAM_PARTITIONS
+from settlement_pipeline import build_summary, build_merged_doc, build_all_outputs, SETTLEMENT_WORKERS
+from schema_detect import classify_files
+from reconciliation_store import STATE_FILE
+from results_archive import ResultsArchive, ARCHIVE_FILE, QUERY_LIMIT
+from bank_pipeline import process_bank_statement
+from row_remover_pipeline import remove_action_rows
+
+# Named, as __name__ is "__main__" when run with python -m cli
+log = logging.getLogger("cli")
+
+
+SETTLEMENT_OUTPUTS = {
+    'summary': build_summary,
+    'merged': build_merged_doc,
+    'all': build_all_outputs,
+}
+
+
+class ConsoleJob:
+    """
+    Stands in for workers.Worker when a pipeline runs from the command line:
+    every new stage is printed to stderr, and the run is never cancelled
+    (Ctrl+C interrupts it instead).
+    """
+    def __init__(self, name, quiet=False):
+        self.name = name
+        self.progress = ProgressReporter(callback=None if quiet else self._report)
+        self._stage = None
+
+    def is_cancelled(self):
+        return False
+
+    def check_cancelled(self):
+        pass
+
+    def _report(self, update):
+        if update.stage == self._stage:
+            return
+        self._stage = update.stage
+        print(f"[{update.percent:3d}%] {self.name}: {update.stage or 'done'}", file=sys.stderr)
+
+
+class CliError(Exception):
+    """Invalid command-line input, reported without a traceback."""
+
+
+def main(argv=None):
+    """Run one subcommand; returns 0 on success, 1 if a pipeline failed and 2 for bad input."""
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else None
+    configure_logging(level, fmt="%(levelname)s %(name)s: %(message)s")
+    try:
+        return args.command(args)
+    except CliError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    except Exception:
+        log.exception("%s failed", args.command_name)
+        return 1
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Kochi Metro reconciliation tools")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="only print warnings and errors")
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="also print debug diagnostics")
+    subparsers = parser.add_subparsers(required=True, metavar="COMMAND")
+
+    compare = subparsers.add_parser("compare", help="compare an AFC export with a Triffy export")
+    compare.add_argument("afc", help="AFC .xlsx file")
+    compare.add_argument("triffy", help="Triffy .xlsx file")
+    compare.add_argument("-o", "--output", required=True, help="output .xlsx file")
+    compare.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=None,
+                         help="compare partition by partition from disk to bound memory "
+                              "(default: only for inputs over the size threshold)")
+    compare.add_argument("--partitions", type=int, default=STREAM_PARTITIONS,
+                         help=f"number of partitions in streaming mode (default: {STREAM_PARTITIONS})")
+    compare.add_argument("--archive", action=argparse.BooleanOptionalAction, default=ARCHIVE_RESULTS,
+                         help=f"store the Errors and Equal rows in {ARCHIVE_FILE} for the history command")
+    compare.set_defaults(command=_run_compare, command_name="compare")
+
+    settlement = subparsers.add_parser("settlement", help="reconcile settlement reports against the AFC-triffi file")
+    settlement.add_argument("main_file", help="AFC-triffi .xlsx file")
+    settlement.add_argument("settlement_files", nargs="+",
+                            help="settlement reports or directories; each goes to the app its file name "
+                                 "names if its columns fit, else to the app its columns fit best")
+    settlement.add_argument("-o", "--output", required=True, help="output .xlsx file")
+    settlement.add_argument("--kind", choices=sorted(SETTLEMENT_OUTPUTS), default="all",
+                            help="summary, merged sheets or both (default: all)")
+    settlement.add_argument("--workers", type=int, default=SETTLEMENT_WORKERS,
+                            help="processes reading the settlement files in parallel, 0 for none "
+                                 f"(default: {SETTLEMENT_WORKERS})")
+    settlement.add_argument("--incremental", action="store_true",
+                            help="only redo the days that changed since the last incremental run, "
+                                 f"reusing the results kept in {STATE_FILE}")
+    settlement.add_argument("--archive", action=argparse.BooleanOptionalAction, default=ARCHIVE_RESULTS,
+                            help=f"store the merged rows in {ARCHIVE_FILE} for the history command")
+    settlement.set_defaults(command=_run_settlement, command_name="settlement")
+
+    history = subparsers.add_parser("history", help="look up archived compare and settlement results")
+    history.add_argument("text", nargs="?", default="", help="TicketNUmber, order_id or transaction_ref_no")
+    history.add_argument("--app", help="only this ONDCapp")
+    history.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="only insertDT on or after")
+    history.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="only insertDT on or before")
+    history.add_argument("--limit", type=int, default=QUERY_LIMIT,
+                         help=f"most rows shown (default: {QUERY_LIMIT})")
+    history.set_defaults(command=_run_history, command_name="history")
+
+    bank = subparsers.add_parser("bank", help="total bank statement credits per app and date")
+    bank.add_argument("inputs", nargs="+", help="bank statement .xlsx files or directories")
+    bank.add_argument("-o", "--output", required=True,
+                      help="output .xlsx file, or a directory when there are several inputs")
+    bank.set_defaults(command=_run_bank, command_name="bank")
+
+    remove_rows = subparsers.add_parser("remove-rows", help="drop rows by their Action value and consolidate the sheets")
+    remove_rows.add_argument("inputs", nargs="+", help="reviewed .xlsx files or directories")
+    remove_rows.add_argument("--remove", action="append", required=True, metavar="ACTION",
+                             help="Action value to remove; repeat for several")
+    remove_rows.add_argument("-o", "--output", required=True,
+                             help="output .xlsx file, or a directory when there are several inputs")
+    remove_rows.set_defaults(command=_run_remove_rows, command_name="remove-rows")
+
+    return parser
+
+
+def _run_compare(args):
+    save_path = _xlsx_path(args.output)
+    job = ConsoleJob("compare", args.quiet)
+    streaming = args.streaming if args.streaming is not None else should_stream(args.afc, args.triffy)
+    if streaming:
+        if args.partitions < 1:
+            raise CliError("--partitions must be at least 1")
+        compare_files_streaming(args.afc, args.triffy, save_path, job=job, partitions=args.partitions,
+                                archive=args.archive)
+    else:
+        compare_files(args.afc, args.triffy, save_path, job=job, archive=args.archive)
+    print(save_path)
+    return 0
+
+
+def _run_settlement(args):
+    paths = []
+    named_paths = set()  # given one by one rather than found in a directory
+    for path in args.settlement_files:
+        for file_path in _expand_inputs([path]):
+            paths.append(file_path)
+            if not os.path.isdir(path):
+                named_paths.add(file_path)
+
+    settlement_files = {}
+    for match in classify_files(paths, load_config()):
+        if match.app is None:
+            if match.path not in named_paths:
+                log.warning("Skipping %s: %s", match.path, match.reason)
+                continue
+            raise CliError(f"{match.path}: {match.reason}")
+        if match.app in settlement_files:
+            raise CliError(f"Two settlement files for {match.app}: "
+                           f"{settlement_files[match.app]} and {match.path}")
+        settlement_files[match.app] = match.path
+
+    if not settlement_files:
+        raise CliError("No settlement files found")
+
+    save_path = _xlsx_path(args.output)
+    job_fn = SETTLEMENT_OUTPUTS[args.kind]
+    job_fn(args.main_file, settlement_files, save_path, job=ConsoleJob("settlement", args.quiet),
+           workers=args.workers, incremental=args.incremental, archive=args.archive)
+    print(save_path)
+    return 0
+
+
+def _run_history(args):
+    if not (args.text or args.app or args.date_from or args.date_to):
+        raise CliError("Give an ID, --app, --from or --to to search by")
+    with ResultsArchive() as archive:
+        rows = archive.lookup(args.text, args.app, args.date_from, args.date_to, limit=args.limit + 1)
+    if rows.empty:
+        print("No archived results match", file=sys.stderr)
+        return 0
+    print(rows.head(args.limit).to_string(index=False))
+    if len(rows) > args.limit:
+        print(f"More rows match than the {args.limit} shown; narrow the search or raise --limit", file=sys.stderr)
+    return 0
+
+
+def _run_bank(args):
+    return _run_batch(args, "bank_amounts",
+                      lambda path, save_path, job: process_bank_statement(path, save_path, job))
+
+
+def _run_remove_rows(args):
+    return _run_batch(args, "consolidated",
+                      lambda path, save_path, job: remove_action_rows(path, args.remove, save_path, job))
+
+
+def _run_batch(args, suffix, run):
+    """Run one pipeline per input file; returns 1 if any of them failed."""
+    inputs = _expand_inputs(args.inputs)
+    if not inputs:
+        raise CliError("No .xlsx files found")
+
+    to_directory = (len(inputs) > 1 or any(os.path.isdir(path) for path in args.inputs)
+                    or os.path.isdir(args.output) or args.output.endswith(("/", os.sep)))
+    if not to_directory:
+        targets = [(inputs[0], _xlsx_path(args.output))]
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        targets = [
+            (path, os.path.join(args.output, f"{os.path.splitext(os.path.basename(path))[0]}_{suffix}.xlsx"))
+            for path in inputs
+        ]
+
+    failed = 0
+    for path, save_path in targets:
+        try:
+            run(path, save_path, ConsoleJob(os.path.basename(path), args.quiet))
+        except Exception:
+            log.exception("Failed to process %s", path)
+            failed += 1
+        else:
+            print(save_path)
+
+    if failed:
+        log.error("%d of %d files failed", failed, len(targets))
+    return 1 if failed else 0
+
+
+def _expand_inputs(paths):
+    """Expand directories to the .xlsx files in them (Excel lock files excluded), sorted by name."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(".xlsx") and not name.startswith("~$")
+            ))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise CliError(f"No such file or directory: {path}")
+    return files
+
+
+def _xlsx_path(path):
+    return path if path.endswith(".xlsx") else path + ".xlsx"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
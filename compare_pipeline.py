@@ -0,0 +1,418 @@
+import logging
+import os
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from xlsx_export import SheetSpec, StreamSheetSpec, write_workbook
+from workbook_cache import read_excel_cached
+from excel_reader import STRING, FLOAT, DATETIME, CATEGORY, iter_sheet_chunks
+from categories import with_categories, map_values, constant_category
+from key_index import KeyIndex, outer_join
+from partition_store import PartitionStore
+from tracing import span, debug_enabled
+from results_archive import ResultsArchive, ARCHIVE_STAGE
+
+log = logging.getLogger(__name__)
+
+
+# Relative cost of each compare stage, used to turn stage progress into an
+# overall percentage
+COMPARE_STAGES = [
+    ("Reading AFC file", 30),
+    ("Aggregating AFC data", 10),
+    ("Reading Triffy file", 20),
+    ("Aggregating Triffy data", 5),
+    ("Merging AFC and Triffy", 5),
+    ("Categorising records", 5),
+    ("Writing Errors and Equal sheets", 25),
+]
+
+# Stages of compare_files_streaming
+STREAMING_STAGES = [
+    ("Partitioning AFC file", 35),
+    ("Partitioning Triffy file", 20),
+    ("Comparing partitions", 15),
+    ("Writing Errors and Equal sheets", 30),
+]
+
+# Streaming mode: rows read per chunk and number of on-disk partitions.
+# Peak memory is roughly one chunk while partitioning and one partition
+# (about 1/STREAM_PARTITIONS of the data) while comparing.
+STREAM_CHUNK_ROWS = 100000
+STREAM_PARTITIONS = int(os.getenv("KOCHIMETRO_STREAM_PARTITIONS", "32"))
+
+# Inputs larger than this together are compared in streaming mode
+STREAMING_THRESHOLD_MB = int(os.getenv("KOCHIMETRO_STREAMING_MB", "150"))
+
+# Only these columns are read from the inputs, with their type hints
+AFC_COLUMNS = [
+    'TicketNUmber', 'QRCodePrice', 'QRCodeId', 'insertDT',
+    'FromStation', 'To Station', 'ONDCapp', 'descCode'
+]
+AFC_DTYPES = {
+    'TicketNUmber': STRING, 'QRCodePrice': FLOAT, 'insertDT': DATETIME,
+    'FromStation': CATEGORY, 'To Station': CATEGORY, 'ONDCapp': CATEGORY, 'descCode': CATEGORY
+}
+
+TRIFFY_COLUMNS = [
+    'ticket_number', 'total_amount', 'transaction_ref_no', 'order_id',
+    'booking_status', 'source', 'destination', 'booking_date'
+]
+TRIFFY_DTYPES = {
+    'ticket_number': STRING, 'total_amount': FLOAT, 'transaction_ref_no': STRING,
+    'order_id': STRING, 'booking_date': DATETIME,
+    'booking_status': CATEGORY, 'source': CATEGORY, 'destination': CATEGORY
+}
+
+# Choices offered in the Action dropdown of both output sheets
+ACTION_OPTIONS = ["Option 1", "Option 2", "Option 3", "Option 4", "Option 5"]
+
+# Columns of the Errors and Equal sheets, in order
+OUTPUT_COLUMNS = [
+    'TicketNUmber', 'QRCodeId', 'insertDT', 'FromStation', 'To Station',
+    'total_amount', 'QRCodePrice', 'ONDCapp', 'transaction_ref_no',
+    'order_id', 'booking_status', 'descCode', 'Remark', 'Action'
+]
+
+
+def should_stream(*paths):
+    """Whether inputs of this size should go through compare_files_streaming."""
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    return total_bytes > STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+def compare_files(afc_path, triffy_path, save_path, job, archive=False):
+    """
+    Background job: compare the AFC and Triffy exports and write the
+    Errors/Equal workbook to save_path; with archive, also store both
+    sheets in the ResultsArchive.
+    """
+    with span(log, "compare", afc=os.path.basename(afc_path), triffy=os.path.basename(triffy_path)) as trace, \
+            (ResultsArchive() if archive else nullcontext()) as results:
+        return _compare_files(afc_path, triffy_path, save_path, job, results, trace)
+
+
+def _compare_files(afc_path, triffy_path, save_path, job, results, trace):
+    progress = job.progress
+    progress.plan(COMPARE_STAGES + ([ARCHIVE_STAGE] if results is not None else []))
+
+    # Read and clean AFC data
+    progress.stage("Reading AFC file")
+    afc_df = read_excel_cached(afc_path, columns=AFC_COLUMNS, dtypes=AFC_DTYPES)
+    progress.update(len(afc_df), len(afc_df))
+    trace.set(afc_rows=len(afc_df))
+    if debug_enabled(log):
+        log.debug("Original AFC sum: %s", afc_df['QRCodePrice'].sum())
+
+    afc_df = _clean_afc(afc_df)
+
+    # Log AFC data quality
+    if debug_enabled(log):
+        log.debug("AFC after cleaning: rows=%d unique_tickets=%d duplicate_tickets=%d",
+                  len(afc_df), afc_df['TicketNUmber'].nunique(), afc_df['TicketNUmber'].duplicated().sum())
+
+    progress.stage("Aggregating AFC data", total=len(afc_df))
+    afc_df = _aggregate_afc(afc_df)
+
+    if debug_enabled(log):
+        log.debug("AFC after aggregation: tickets=%d sum=%.2f", len(afc_df), afc_df['QRCodePrice'].sum())
+
+    # Read and clean Triffy data
+    progress.stage("Reading Triffy file")
+    triffy_df = read_excel_cached(triffy_path, columns=TRIFFY_COLUMNS, dtypes=TRIFFY_DTYPES)
+    progress.update(len(triffy_df), len(triffy_df))
+    trace.set(triffy_rows=len(triffy_df))
+    if debug_enabled(log):
+        log.debug("Triffy before cleaning: rows=%d unique_tickets=%d duplicate_tickets=%d sum=%s",
+                  len(triffy_df), triffy_df['ticket_number'].nunique(),
+                  triffy_df['ticket_number'].duplicated().sum(), triffy_df['total_amount'].sum())
+
+    progress.stage("Aggregating Triffy data", total=len(triffy_df))
+    triffy_df = _clean_triffy(triffy_df)
+
+    if debug_enabled(log):
+        log.debug("Triffy after cleaning: rows=%d unique_tickets=%d sum=%s",
+                  len(triffy_df), triffy_df['ticket_number'].nunique(), triffy_df['total_amount'].sum())
+
+    triffy_df = _aggregate_triffy(triffy_df)
+
+    if debug_enabled(log):
+        log.debug("Triffy after aggregation: tickets=%d sum=%.2f", len(triffy_df), triffy_df['total_amount'].sum())
+
+    # Merge with validation
+    progress.stage("Merging AFC and Triffy", total=len(afc_df) + len(triffy_df))
+    pre_merge_afc_sum = afc_df['QRCodePrice'].sum()
+    merged_df = _join_tickets(afc_df, triffy_df)
+    trace.set(merged_rows=len(merged_df))
+
+    if debug_enabled(log):
+        log.debug("AFC sum before merge: %s, after merge: %s, Triffy total after merge: %.2f",
+                  pre_merge_afc_sum, merged_df['QRCodePrice'].sum(), merged_df['total_amount'].sum())
+
+    progress.stage("Categorising records", total=len(merged_df))
+    final_df, afc_equal_to_triffy = _categorise(merged_df)
+    trace.set(errors=len(final_df), equal=len(afc_equal_to_triffy))
+
+    # Stream both sheets with the Action dropdown and column widths in one pass
+    progress.stage("Writing Errors and Equal sheets", total=len(final_df) + len(afc_equal_to_triffy))
+    write_workbook(save_path, [
+        SheetSpec("Errors", final_df, action_options=ACTION_OPTIONS, auto_width=True),
+        SheetSpec("Equal", afc_equal_to_triffy, action_options=ACTION_OPTIONS, auto_width=True),
+    ], progress=progress)
+
+    _check_sums(pre_merge_afc_sum, final_df['QRCodePrice'].sum(), afc_equal_to_triffy['QRCodePrice'].sum())
+
+    if results is not None:
+        progress.stage(ARCHIVE_STAGE[0], total=len(final_df) + len(afc_equal_to_triffy))
+        run_id = results.begin_run('compare', [afc_path, triffy_path])
+        for sheet, df in (("Errors", final_df), ("Equal", afc_equal_to_triffy)):
+            results.add_rows(run_id, 'compare', df, sheet=sheet)
+            progress.advance(len(df))
+        results.commit()
+
+    progress.finish()
+    return save_path
+
+
+def compare_files_streaming(afc_path, triffy_path, save_path, job,
+                            partitions=STREAM_PARTITIONS, chunk_rows=STREAM_CHUNK_ROWS, archive=False):
+    """
+    Background job: the same comparison and workbook as compare_files, for
+    exports too large to load at once.
+
+    Both inputs are read chunk_rows rows at a time and their cleaned rows
+    hash-partitioned by ticket number into temporary files. Every partition
+    holds all rows of its tickets, so it is aggregated, joined and
+    categorised on its own exactly like the whole file would be. Each
+    partition's Errors and Equal rows are stored sorted by ticket and merged
+    back into one ticket order while the sheets are written. With archive,
+    they also go to the ResultsArchive as each partition is done.
+    """
+    with span(log, "compare (streaming)", afc=os.path.basename(afc_path),
+              triffy=os.path.basename(triffy_path), partitions=partitions) as trace, \
+            PartitionStore(partitions) as store, \
+            (ResultsArchive() if archive else nullcontext()) as results:
+        return _compare_files_streaming(afc_path, triffy_path, save_path, job, store, results, chunk_rows, trace)
+
+
+def _compare_files_streaming(afc_path, triffy_path, save_path, job, store, results, chunk_rows, trace):
+    progress = job.progress
+    progress.plan(STREAMING_STAGES)
+
+    progress.stage("Partitioning AFC file")
+    afc_rows = 0
+    for chunk in iter_sheet_chunks(afc_path, columns=AFC_COLUMNS, dtypes=AFC_DTYPES, chunk_rows=chunk_rows):
+        afc_rows += len(chunk)
+        chunk = _clean_afc(chunk)
+        store.scatter("afc", chunk, chunk['TicketNUmber'])
+        progress.advance(len(chunk))
+    trace.set(afc_rows=afc_rows)
+
+    progress.stage("Partitioning Triffy file")
+    triffy_rows = 0
+    for chunk in iter_sheet_chunks(triffy_path, columns=TRIFFY_COLUMNS, dtypes=TRIFFY_DTYPES, chunk_rows=chunk_rows):
+        triffy_rows += len(chunk)
+        chunk = _clean_triffy(chunk)
+        store.scatter("triffy", chunk, chunk['ticket_number'])
+        progress.advance(len(chunk))
+    trace.set(triffy_rows=triffy_rows)
+
+    progress.stage("Comparing partitions", total=store.partitions, unit="partitions")
+    run_id = results.begin_run('compare', [afc_path, triffy_path]) if results is not None else None
+    pre_merge_afc_sum = errors_sum = equal_sum = 0.0
+    errors_rows = equal_rows = 0
+    for partition in range(store.partitions):
+        afc_df = _aggregate_afc(store.load("afc", partition))
+        triffy_df = _aggregate_triffy(store.load("triffy", partition))
+        pre_merge_afc_sum += afc_df['QRCodePrice'].sum()
+
+        final_df, afc_equal_to_triffy = _categorise(_join_tickets(afc_df, triffy_df))
+        for name, df in (("errors", final_df), ("equal", afc_equal_to_triffy)):
+            for start in range(0, len(df), chunk_rows):
+                store.append(name, partition, df.iloc[start:start + chunk_rows])
+            if results is not None:
+                results.add_rows(run_id, 'compare', df, sheet=name.capitalize())
+        errors_sum += final_df['QRCodePrice'].sum()
+        equal_sum += afc_equal_to_triffy['QRCodePrice'].sum()
+        errors_rows += len(final_df)
+        equal_rows += len(afc_equal_to_triffy)
+        progress.advance()
+    trace.set(errors=errors_rows, equal=equal_rows)
+
+    progress.stage("Writing Errors and Equal sheets", total=errors_rows + equal_rows)
+    write_workbook(save_path, [
+        StreamSheetSpec("Errors", OUTPUT_COLUMNS, store.merged_rows("errors"),
+                        action_options=ACTION_OPTIONS, auto_width=True),
+        StreamSheetSpec("Equal", OUTPUT_COLUMNS, store.merged_rows("equal"),
+                        action_options=ACTION_OPTIONS, auto_width=True),
+    ], progress=progress)
+
+    _check_sums(pre_merge_afc_sum, errors_sum, equal_sum)
+    if results is not None:
+        results.commit()
+
+    progress.finish()
+    return save_path
+
+
+def _clean_afc(afc_df):
+    # Clean and validate AFC data with improved handling
+    afc_df['TicketNUmber'] = afc_df['TicketNUmber'].astype(str).str.strip()
+    afc_df['QRCodePrice'] = pd.to_numeric(afc_df['QRCodePrice'], errors='coerce')
+
+    # Remove rows with null TicketNUmbers or QRCodePrices
+    return afc_df.dropna(subset=['TicketNUmber', 'QRCodePrice'])
+
+
+def _aggregate_afc(afc_df):
+    # First, sort by insertDT to ensure chronological order; stable, so
+    # rows with the same time keep their file order
+    afc_df = afc_df.sort_values('insertDT', kind='stable')
+
+    # A ticket with any REFUND row is a refund; flag the rows up front so
+    # the groupby only needs built-in aggregations
+    afc_df['is_refund'] = map_values(afc_df['descCode'], lambda code: str(code).upper()) == 'REFUND'
+
+    # Aggregate AFC data, one row per ticket
+    afc_df = afc_df.groupby('TicketNUmber', as_index=False).agg({
+        'QRCodePrice': 'sum',  # Sum all prices
+        'QRCodeId': 'first',  # Take the first QRCode ID
+        'insertDT': 'last',   # Take the latest date
+        'FromStation': 'first',
+        'To Station': 'first',
+        'ONDCapp': 'first',
+        'descCode': 'first',  # First non-null code...
+        'is_refund': 'any'    # ...unless the ticket was refunded
+    })
+    descCode = with_categories(afc_df['descCode'], 'UNKNOWN', 'REFUND')
+    afc_df['descCode'] = descCode.fillna('UNKNOWN').mask(afc_df['is_refund'], 'REFUND')
+    return afc_df.drop(columns='is_refund')
+
+
+def _clean_triffy(triffy_df):
+    # Clean Triffy data
+    triffy_df['ticket_number'] = triffy_df['ticket_number'].astype(str).str.strip()
+    triffy_df['total_amount'] = pd.to_numeric(triffy_df['total_amount'], errors='coerce')
+
+    # Remove rows with null values
+    return triffy_df.dropna(subset=['ticket_number', 'total_amount'])
+
+
+def _aggregate_triffy(triffy_df):
+    return triffy_df.groupby('ticket_number', as_index=False).agg({
+        'total_amount': 'sum',
+        'transaction_ref_no': 'first',
+        'order_id': 'first',
+        'booking_status': 'first',
+        'source': 'first',
+        'destination': 'first',
+        'booking_date': 'first'
+    })
+
+
+def _join_tickets(afc_df, triffy_df):
+    # Both sides are aggregated per ticket, so the join is a gather on the
+    # factorized ticket keys
+    ticket_index = KeyIndex(afc_df['TicketNUmber'], triffy_df['ticket_number'])
+    merged_df = outer_join(
+        afc_df,
+        triffy_df,
+        ticket_index.codes(0),
+        ticket_index.codes(1),
+        indicator=True
+    )
+    merged_df["TicketNUmber"] = merged_df['TicketNUmber'].fillna(merged_df['ticket_number'])
+    return merged_df
+
+
+def _categorise(merged_df):
+    """Remark every joined ticket and split them into the Errors and Equal sheets."""
+    # Convert dates
+    merged_df['insertDT'] = pd.to_datetime(merged_df['insertDT']).dt.date
+    merged_df['booking_date'] = pd.to_datetime(merged_df['booking_date']).dt.date
+
+    # Simplified categorization logic
+    merged_df['Remark'] = ''  # Initialize Remark column
+
+    # Basic conditions
+    is_refund = merged_df['descCode'].str.upper() == 'REFUND'
+    amounts_match = np.isclose(merged_df['QRCodePrice'], merged_df['total_amount'], atol=0.01)
+    full_refund = np.isclose(merged_df['QRCodePrice'], -merged_df['total_amount'], atol=0.01)
+    triffi_revenue_more = merged_df['total_amount'] > merged_df['QRCodePrice']
+    triffi_revenue_zero = merged_df['total_amount'] == 0
+    afc_revenue_more = merged_df['QRCodePrice'] > merged_df['total_amount']
+
+    # Categorize each record
+    conditions = [
+        (merged_df['_merge'] == 'left_only'),
+        (merged_df['_merge'] == 'right_only'),
+        (merged_df['_merge'] == 'both') & is_refund,
+        (merged_df['_merge'] == 'both') & amounts_match,
+        (merged_df['_merge'] == 'both') & full_refund,
+        (merged_df['_merge'] == 'both') & triffi_revenue_zero,
+        (merged_df['_merge'] == 'both') & afc_revenue_more,
+        (merged_df['_merge'] == 'both') & triffi_revenue_more,
+        (merged_df['_merge'] == 'both')  # catches any remaining 'both' cases
+    ]
+
+    choices = [
+        'In AFC but not in Triffy',
+        'In Triffy but not in AFC',
+        'AFC Refund but Triffy Booked',
+        'AFC = Triffy',
+        'AFC Triffy Full Refund',
+        'In AFC but not in Triffy',
+        'AFC Revenue More than Triffy',
+        'Triffy Revenue More than AFC',
+        'Misc'
+    ]
+
+    # Selected as codes into the distinct remarks, so Remark is a categorical
+    remarks = list(dict.fromkeys(choices + ['Uncategorized']))
+    codes = np.select(conditions, [remarks.index(choice) for choice in choices], default=len(remarks) - 1)
+    merged_df['Remark'] = pd.Categorical.from_codes(codes, remarks)
+
+    # Split into Errors and Equal sheets
+    afc_equal_to_triffy = merged_df[merged_df['Remark'] == 'AFC = Triffy'].copy()
+    final_df = merged_df[merged_df['Remark'] != 'AFC = Triffy'].copy()
+
+    # Drop merge indicator column
+    final_df.drop(columns=['_merge'], inplace=True, errors='ignore')
+    afc_equal_to_triffy.drop(columns=['_merge'], inplace=True, errors='ignore')
+
+    # Prepare final columns
+    final_cols = OUTPUT_COLUMNS[:-1]
+
+    # Fill missing values appropriately
+    numeric_cols = ['QRCodePrice', 'total_amount']
+    other_cols = [col for col in final_cols if col not in numeric_cols]
+
+    final_df[numeric_cols] = final_df[numeric_cols].fillna(0)
+    final_df[other_cols] = _fill_missing(final_df[other_cols])
+    afc_equal_to_triffy[numeric_cols] = afc_equal_to_triffy[numeric_cols].fillna(0)
+    afc_equal_to_triffy[other_cols] = _fill_missing(afc_equal_to_triffy[other_cols])
+
+    # Explicitly set column order for both DataFrames
+    final_df = final_df[final_cols]
+    afc_equal_to_triffy = afc_equal_to_triffy[final_cols]
+
+    # Add Action column while preserving order
+    final_df.insert(len(final_cols), 'Action', constant_category('', len(final_df)))  # Add Action as the last column
+    afc_equal_to_triffy.insert(len(final_cols), 'Action', constant_category('', len(afc_equal_to_triffy)))
+    return final_df, afc_equal_to_triffy
+
+
+def _fill_missing(df):
+    # Categorical columns need MISSING among their categories first
+    return pd.DataFrame({column: with_categories(df[column], "MISSING") for column in df.columns},
+                        index=df.index).fillna("MISSING")
+
+
+def _check_sums(pre_merge_afc_sum, errors_sum, equal_sum):
+    # Verify sums
+    total_sum = errors_sum + equal_sum
+    log.info("QRCodePrice sums: main=%s errors=%s equal=%s errors+equal=%s",
+             pre_merge_afc_sum, errors_sum, equal_sum, total_sum)
+    if not np.isclose(pre_merge_afc_sum, total_sum, rtol=1e-5):
+        log.warning("Sums do not match: Main sum = %s, Total of Errors and Equal = %s, Difference: %s",
+                    pre_merge_afc_sum, total_sum, pre_merge_afc_sum - total_sum)
@@ -0,0 +1,2 @@
+# Makes pytest put the repository root on sys.path, so tests/ can import
+# the app's modules however pytest is started
@@ -0,0 +1,70 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Read-only table model backed directly by a DataFrame's columns.
+    - Cells are formatted lazily in data(), so only visible rows cost anything
+    - Rows are exposed in batches through canFetchMore/fetchMore, so the view
+      opens in constant time no matter how large the frame is
+    """
+    FETCH_BATCH_SIZE = 1000
+
+    def __init__(self, df, parent=None):
+        super().__init__(parent)
+        self._df = df
+        # Keep one array per column; positional access avoids issues with
+        # duplicate column names and skips the per-cell pandas indexing cost
+        self._columns = [_display_values(df.iloc[:, i]) for i in range(df.shape[1])]
+        self._headers = [str(col) for col in df.columns]
+        self._total_rows = len(df)
+        self._loaded_rows = min(self._total_rows, self.FETCH_BATCH_SIZE)
+
+    def dataframe(self):
+        return self._df
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        return str(self._columns[index.column()][index.row()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded_rows < self._total_rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        remaining = self._total_rows - self._loaded_rows
+        batch = min(remaining, self.FETCH_BATCH_SIZE)
+        if batch <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded_rows, self._loaded_rows + batch - 1)
+        self._loaded_rows += batch
+        self.endInsertRows()
+
+
+def _display_values(series):
+    # numpy datetimes print as 2024-01-05T00:00:00.000000000; as pandas
+    # Timestamps (and Timedeltas) they print like the frame shows them
+    if series.dtype.kind in "mM":
+        return series.astype(object).to_numpy()
+    return series.to_numpy()
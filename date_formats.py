@@ -0,0 +1,111 @@
+"""
+Dates of the AFC-triffi and settlement reports reduced to days.
+
+pd.to_datetime(format='mixed') guesses the format of every value on its
+own, which is slow and reads 01/10/2024 as January 10th and 13/10/2024 as
+October 13th in one column. Instead the date part of every value (up to
+the first space or the 'T' of an ISO timestamp) is taken and the first of
+DATE_FORMATS that reads the most distinct date parts is used for the
+whole column; days are parsed once each, not once per row. An app's format
+is cached in its config.json mapping as date_format and tried first next
+time, which also settles reports whose days are all 12 or lower.
+
+Days stay datetime64 (at midnight; pandas has no datetime64[D] column)
+until format_days turns them into text for the workbooks.
+"""
+import logging
+from datetime import date
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Formats of the date part tried in this order; day first before month
+# first, as the reports are Indian
+DATE_FORMATS = [
+    '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d',
+    '%m/%d/%Y', '%m-%d-%Y', '%d-%b-%Y', '%d-%b-%y', '%d/%m/%y', '%m/%d/%y',
+]
+
+# Most distinct date parts a format is tried on
+SAMPLE_SIZE = 500
+
+# Date part of a value: what comes before a space or the T of 2024-10-01T10:00
+_DATE_PART = r'^\s*(\S+?)(?:T\d|\s|$)'
+
+
+def parse_days(values, date_format=None):
+    """
+    values as days and the format of their date part, or None for values
+    that already were dates.
+    - date_format: format found before; used when it reads every sampled
+      date part, otherwise a format is inferred
+    - values no format reads are parsed one by one as before; raises if
+      they cannot be parsed at all
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            values = values.dt.tz_localize(None)
+        return values.dt.normalize(), date_format
+
+    days = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    present = values.notna().to_numpy()
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+        # Cells Excel already read as dates need no format
+        is_date = values.map(lambda value: isinstance(value, (date, np.datetime64))).to_numpy()
+        if is_date.any():
+            days[is_date] = pd.to_datetime(values[is_date]).dt.normalize().to_numpy()
+            present &= ~is_date
+
+    date_part = values.astype(str).str.extract(_DATE_PART, expand=False).where(present)
+    codes, parts = pd.factorize(date_part)
+    sample = pd.Series(parts[np.linspace(0, len(parts) - 1, min(len(parts), SAMPLE_SIZE)).astype(int)]
+                       if len(parts) else parts, dtype=object)
+    if date_format is None or _readable(sample, date_format) < len(sample):
+        date_format = infer_format(sample)
+
+    if date_format is not None:
+        part_days = pd.to_datetime(pd.Series(parts, dtype=object), format=date_format, errors='coerce').to_numpy()
+        read = codes >= 0
+        days[read] = part_days[codes[read]]
+
+    unread = present & np.isnat(days)
+    if unread.any():
+        log.debug("%d of %d dates do not match %s, parsing them one by one", unread.sum(), len(values), date_format)
+        days[unread] = _parse_mixed(values[unread]).to_numpy()
+    days = pd.Series(days, index=values.index)
+    return days, date_format
+
+
+def infer_format(date_parts):
+    """The first of DATE_FORMATS reading the most of date_parts, or None if none reads any."""
+    best, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = _readable(date_parts, date_format)
+        if count > best_count:
+            best, best_count = date_format, count
+            if count == len(date_parts):
+                break
+    return best
+
+
+def format_days(values):
+    """Days as YYYY-MM-DD text, as the workbooks show them; other values unchanged."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime('%Y-%m-%d')
+    values = values.astype(object)
+    is_day = values.map(lambda value: isinstance(value, (date, np.datetime64)))
+    return values.mask(is_day, pd.to_datetime(values[is_day]).dt.strftime('%Y-%m-%d'))
+
+
+def _readable(date_parts, date_format):
+    return pd.to_datetime(date_parts, format=date_format, errors='coerce').notna().sum()
+
+
+def _parse_mixed(values):
+    # UTC timestamps (like nammayathri's) keep their wall clock day
+    text = values.astype(str).str.replace(r'\s*UTC$', '', regex=True)
+    days = pd.to_datetime(text, format='mixed')
+    if isinstance(days.dtype, pd.DatetimeTZDtype):
+        days = days.dt.tz_localize(None)
+    return days.dt.normalize()
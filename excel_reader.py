@@ -0,0 +1,316 @@
+import posixpath
+import zipfile
+from collections import namedtuple
+from datetime import datetime
+from xml.etree.ElementTree import iterparse
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+from categories import as_category
+
+# python-calamine parses xlsx several times faster than openpyxl; use it
+# when it is installed and fall back to openpyxl otherwise
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Column type hints understood by read_sheet
+STRING = "string"      # IDs: str values, NaN kept for empty cells
+FLOAT = "float"        # amounts: float64, unparseable values become NaN
+DATETIME = "datetime"  # timestamps: datetime64, unparseable values become NaT
+CATEGORY = "category"  # few distinct texts (apps, stations, statuses): categorical
+
+# One column of a worksheet as seen by sniff_sheet: its header, the type
+# hint inferred from the sampled cells (STRING, FLOAT or DATETIME; None if
+# they are all empty) and the non-empty sampled values.
+SheetColumn = namedtuple("SheetColumn", ["name", "kind", "samples"])
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def read_sheet(path, sheet_name=0, columns=None, dtypes=None):
+    """
+    Read one worksheet, materializing only the given columns.
+    - columns: names to keep; columns missing from the sheet are skipped
+      silently, callers check for the ones they require
+    - dtypes: {column: STRING | FLOAT | DATETIME | CATEGORY} applied right
+      after parsing
+    """
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda name: name in wanted
+
+    df = pd.read_excel(path, sheet_name=sheet_name, usecols=usecols, engine=EXCEL_ENGINE)
+    return apply_dtypes(df, dtypes)
+
+
+def iter_sheet_chunks(path, sheet_name=0, columns=None, dtypes=None, chunk_rows=100000):
+    """
+    Read one worksheet chunk_rows rows at a time, with the same column
+    projection and type hints as read_sheet.
+
+    Uses openpyxl's read-only mode, which parses the sheet XML as it goes:
+    slower than calamine, but memory stays bounded by the chunk size
+    whatever the size of the file.
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        wanted = set(columns) if columns is not None else None
+        keep = [i for i, name in enumerate(header)
+                if name is not None and (wanted is None or name in wanted)]
+        names = [header[i] for i in keep]
+
+        batch = []
+        for row in rows:
+            # Trailing empty cells are not stored, so rows can be short
+            batch.append([row[i] if i < len(row) else None for i in keep])
+            if len(batch) == chunk_rows:
+                yield apply_dtypes(pd.DataFrame(batch, columns=names), dtypes)
+                batch = []
+        if batch:
+            yield apply_dtypes(pd.DataFrame(batch, columns=names), dtypes)
+    finally:
+        workbook.close()
+
+
+def sheet_headers(path):
+    """
+    Header row of every worksheet of an .xlsx file, {sheet name: [values]}
+    in workbook order, without parsing the sheets themselves.
+
+    Each sheet's XML is streamed only up to its first non-empty row, and the
+    shared strings only up to the highest index the headers use, so this
+    costs milliseconds where reading a sheet costs seconds. An empty sheet
+    has an empty header.
+    """
+    with zipfile.ZipFile(path) as archive:
+        sheets, epoch = _workbook_parts(archive)
+        rows = {name: _head_rows(archive, part, 1) for name, part in sheets}
+        strings = _shared_strings(archive, _last_string_index(row for head in rows.values() for row in head))
+        date_styles = _date_styles(archive)
+    return {name: [_cell_value(cell, strings, date_styles, epoch) for cell in head[0]] if head else []
+            for name, head in rows.items()}
+
+
+def sniff_sheet(path, sheet_name=0, sample_rows=20):
+    """
+    The columns of one worksheet as SheetColumn tuples, in sheet order,
+    from its header and first sample_rows rows only.
+
+    Like sheet_headers this streams just the start of the sheet, so it takes
+    milliseconds whatever the size of the file. Column names follow what
+    read_sheet would produce: blank headers become "Unnamed: n" and repeated
+    ones get a ".1", ".2" suffix.
+    """
+    with zipfile.ZipFile(path) as archive:
+        sheets, epoch = _workbook_parts(archive)
+        if isinstance(sheet_name, int):
+            part = sheets[sheet_name][1]
+        else:
+            part = dict(sheets).get(sheet_name)
+            if part is None:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        rows = _head_rows(archive, part, sample_rows + 1)
+        strings = _shared_strings(archive, _last_string_index(rows))
+        date_styles = _date_styles(archive)
+
+    if not any(rows):
+        return []
+    values = [{cell[0]: _cell_value(cell, strings, date_styles, epoch) for cell in row} for row in rows]
+    header, data = values[0], values[1:]
+    width = max(position for row in values for position in row) + 1
+
+    columns = []
+    seen = {}
+    for position in range(width):
+        name = header.get(position)
+        name = f"Unnamed: {position}" if name is None or name == "" else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        samples = [row[position] for row in data if row.get(position, "") != ""]
+        columns.append(SheetColumn(name, _infer_kind(samples), samples))
+    return columns
+
+
+def project(df, columns=None, dtypes=None):
+    """Apply the same projection and type hints as read_sheet to an already parsed sheet."""
+    if columns is not None:
+        wanted = set(columns)
+        df = df[[name for name in df.columns if name in wanted]]
+    return apply_dtypes(df.copy(), dtypes)
+
+
+def apply_dtypes(df, dtypes):
+    for column, kind in (dtypes or {}).items():
+        if column not in df.columns:
+            continue
+        if kind == STRING:
+            df[column] = _to_string(df[column])
+        elif kind == FLOAT:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+        elif kind == DATETIME:
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = pd.to_datetime(df[column], errors='coerce', format='mixed')
+        elif kind == CATEGORY:
+            df[column] = as_category(df[column])
+        else:
+            raise ValueError(f"Unknown column type hint: {kind}")
+    return df
+
+
+def _to_string(series):
+    # Whole floats come from numeric ID columns with blanks; write them
+    # without the trailing ".0" so they still match the other side's IDs
+    if pd.api.types.is_float_dtype(series):
+        values = series.map(lambda value: str(int(value)) if value.is_integer() else str(value),
+                            na_action='ignore')
+    else:
+        values = series.map(str, na_action='ignore')
+    return values.astype(object)
+
+
+def _workbook_parts(archive):
+    """(sheet name, zip member) of every worksheet in workbook order, and the date epoch."""
+    workbook_part = "xl/workbook.xml"
+    with archive.open("_rels/.rels") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_PACKAGE_REL_NS}Relationship" and element.get("Type", "").endswith("/officeDocument"):
+                workbook_part = element.get("Target").lstrip("/")
+
+    rels_part = posixpath.join(posixpath.dirname(workbook_part), "_rels",
+                               posixpath.basename(workbook_part) + ".rels")
+    targets = {}
+    with archive.open(rels_part) as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_PACKAGE_REL_NS}Relationship":
+                target = element.get("Target")
+                targets[element.get("Id")] = target.lstrip("/") if target.startswith("/") else \
+                    posixpath.normpath(posixpath.join(posixpath.dirname(workbook_part), target))
+
+    sheets = []
+    epoch = CALENDAR_WINDOWS_1900
+    with archive.open(workbook_part) as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_MAIN_NS}sheet":
+                sheets.append((element.get("name"), targets[element.get(f"{_REL_NS}id")]))
+            elif element.tag == f"{_MAIN_NS}workbookPr" and element.get("date1904") in ("1", "true"):
+                epoch = CALENDAR_MAC_1904
+    return sheets, epoch
+
+
+def _head_rows(archive, part, count):
+    """
+    The first count rows of a sheet holding any value, each a list of
+    (column position, cell type, style index, text) tuples; the type is the
+    cell's t attribute, e.g. "s" with a shared string index as its text.
+    Like pandas, the header is row 1 of the sheet: if that row is blank an
+    empty header row comes first.
+    """
+    rows = []
+    with archive.open(part) as f:
+        for _, element in iterparse(f):
+            if element.tag != f"{_MAIN_NS}row":
+                continue
+            if not rows and element.get("r", "1") != "1":
+                rows.append([])
+            cells = []
+            for position, cell in enumerate(element.iter(f"{_MAIN_NS}c")):
+                # Cells without a reference follow each other without gaps
+                reference = cell.get("r")
+                if reference:
+                    position = column_index_from_string(reference.rstrip("0123456789")) - 1
+                cell_type = cell.get("t", "n")
+                if cell_type == "inlineStr":
+                    text = "".join(t.text or "" for t in cell.iter(f"{_MAIN_NS}t"))
+                else:
+                    value = cell.find(f"{_MAIN_NS}v")
+                    if value is None or value.text is None:
+                        continue
+                    text = value.text
+                cells.append((position, cell_type, int(cell.get("s", 0)), text))
+            element.clear()
+            if cells or not rows:
+                rows.append(cells)
+                if len(rows) == count:
+                    break
+    return rows
+
+
+def _last_string_index(rows):
+    return max((int(text) for row in rows for _, cell_type, _, text in row if cell_type == "s"), default=-1)
+
+
+def _shared_strings(archive, last_index):
+    """The shared strings up to last_index; rich text runs are joined."""
+    strings = []
+    if last_index < 0 or "xl/sharedStrings.xml" not in archive.namelist():
+        return strings
+    with archive.open("xl/sharedStrings.xml") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_MAIN_NS}si":
+                strings.append("".join(t.text or "" for t in element.iter(f"{_MAIN_NS}t")))
+                element.clear()
+                if len(strings) > last_index:
+                    break
+    return strings
+
+
+def _date_styles(archive):
+    """Indices of the cell styles whose number format shows a date or time."""
+    if "xl/styles.xml" not in archive.namelist():
+        return set()
+    formats = dict(BUILTIN_FORMATS)
+    number_formats = []
+    with archive.open("xl/styles.xml") as f:
+        for _, element in iterparse(f):
+            if element.tag == f"{_MAIN_NS}numFmt":
+                formats[int(element.get("numFmtId"))] = element.get("formatCode", "")
+            elif element.tag == f"{_MAIN_NS}cellXfs":
+                number_formats = [int(xf.get("numFmtId", 0)) for xf in element.iter(f"{_MAIN_NS}xf")]
+                break
+    return {style for style, format_id in enumerate(number_formats)
+            if format_id in formats and is_date_format(formats[format_id])}
+
+
+def _cell_value(cell, strings, date_styles, epoch):
+    _, cell_type, style, text = cell
+    if cell_type == "s":
+        return strings[int(text)]
+    if cell_type in ("inlineStr", "str", "e"):
+        return text
+    if cell_type == "b":
+        return text == "1"
+    if cell_type == "d":
+        return datetime.fromisoformat(text)
+    number = int(text) if text.lstrip("-").isdigit() else float(text)
+    return from_excel(number, epoch) if style in date_styles else number
+
+
+def _infer_kind(samples):
+    """Type hint for a column from its sampled values."""
+    if not samples:
+        return None
+    if all(isinstance(value, datetime) for value in samples):
+        return DATETIME
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in samples):
+        return FLOAT
+    text = pd.Series([str(value) for value in samples])
+    if pd.to_numeric(text, errors='coerce').notna().all():
+        return FLOAT
+    # Only text that looks like a date or time, so plain codes are not taken for years
+    if text.str.contains(r"[-/:]").all() and pd.to_datetime(text, errors='coerce', format='mixed', utc=True).notna().all():
+        return DATETIME
+    return STRING
@@ -0,0 +1,133 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit,
+    QComboBox, QCheckBox, QDateEdit, QMessageBox, QTableView
+)
+from PyQt5.QtCore import QDate
+from dataframe_model import DataFrameModel
+from workers import Worker, start_job
+from jobs import search_archive, archive_apps
+
+
+class HistoryTab(QWidget):
+    """
+    Looks up archived compare and settlement results.
+    - Finds rows by TicketNUmber, order_id or transaction_ref_no, optionally
+      narrowed to one app and an insertDT range
+    - Runs only store results when "Save results to history" was ticked
+      on their tab
+    """
+    ALL_APPS = "All apps"
+
+    def __init__(self):
+        super().__init__()
+
+        button_style = """
+            QPushButton {
+                background-color: #4CAF50;
+                color: white;
+                border: none;
+                padding: 8px 20px;
+                border-radius: 4px;
+                font-size: 14px;
+            }
+            QPushButton:hover {
+                background-color: #45a049;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+            }
+        """
+
+        self.main_layout = QVBoxLayout()
+        self.main_layout.setSpacing(15)
+        self.main_layout.setContentsMargins(20, 20, 20, 20)
+
+        # Search line: id, app and the search button
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Ticket number, order ID or transaction reference")
+        self.search_edit.returnPressed.connect(self.search)
+        search_layout.addWidget(self.search_edit, 1)
+
+        self.app_combo = QComboBox()
+        self.app_combo.addItem(self.ALL_APPS)
+        search_layout.addWidget(self.app_combo)
+
+        self.search_button = QPushButton("Search")
+        self.search_button.setStyleSheet(button_style)
+        self.search_button.clicked.connect(self.search)
+        search_layout.addWidget(self.search_button)
+        self.main_layout.addLayout(search_layout)
+
+        # Optional insertDT range
+        dates_layout = QHBoxLayout()
+        self.dates_checkbox = QCheckBox("Only dates from")
+        self.dates_checkbox.toggled.connect(self._set_dates_enabled)
+        dates_layout.addWidget(self.dates_checkbox)
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.date_to = QDateEdit(QDate.currentDate())
+        for date_edit in (self.date_from, self.date_to):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+        dates_layout.addWidget(self.date_from)
+        dates_layout.addWidget(QLabel("to"))
+        dates_layout.addWidget(self.date_to)
+        dates_layout.addStretch(1)
+        self.main_layout.addLayout(dates_layout)
+        self._set_dates_enabled(False)
+
+        self.status_label = QLabel("Search the results of archived compare and settlement runs.")
+        self.main_layout.addWidget(self.status_label)
+
+        self.results_table = QTableView()
+        self.main_layout.addWidget(self.results_table)
+
+        self.setLayout(self.main_layout)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._load_apps()
+
+    def search(self):
+        text = self.search_edit.text().strip()
+        app = self.app_combo.currentText()
+        app = None if app == self.ALL_APPS else app
+        date_from = date_to = None
+        if self.dates_checkbox.isChecked():
+            date_from = self.date_from.date().toString("yyyy-MM-dd")
+            date_to = self.date_to.date().toString("yyyy-MM-dd")
+        if not (text or app or date_from):
+            QMessageBox.warning(self, "Error", "Enter an ID, or pick an app or dates to search by.")
+            return
+
+        self.search_button.setEnabled(False)
+        worker = Worker(search_archive, text, app, date_from, date_to)
+        worker.signals.result.connect(self._on_search_finished)
+        worker.signals.error.connect(
+            lambda message: QMessageBox.critical(self, "Error", f"Error searching the history:\n{message}")
+        )
+        worker.signals.finished.connect(lambda: self.search_button.setEnabled(True))
+        start_job(worker)
+
+    def _on_search_finished(self, result):
+        rows, seconds, capped = result
+        self.results_table.setModel(DataFrameModel(rows))
+        capped = " (first results only)" if capped else ""
+        self.status_label.setText(f"{len(rows)} rows{capped} in {seconds * 1000:.0f} ms")
+
+    def _load_apps(self):
+        worker = Worker(archive_apps)
+        worker.signals.result.connect(self._on_apps_loaded)
+        start_job(worker)
+
+    def _on_apps_loaded(self, apps):
+        # Keep the selection when the list is refreshed
+        current = self.app_combo.currentText()
+        self.app_combo.clear()
+        self.app_combo.addItems([self.ALL_APPS] + apps)
+        index = self.app_combo.findText(current)
+        self.app_combo.setCurrentIndex(max(index, 0))
+
+    def _set_dates_enabled(self, enabled):
+        self.date_from.setEnabled(enabled)
+        self.date_to.setEnabled(enabled)
@@ -0,0 +1,71 @@
+"""
+Background jobs started by the GUI tabs.
+
+The pipelines import pandas, numpy and openpyxl, which take seconds to
+load in the frozen build. The tabs take their jobs from here instead, and
+every job imports its pipeline when it runs: on a worker thread, once a
+file has been picked, rather than while the window opens. The imports are
+plain import statements so that PyInstaller still finds the pipelines.
+"""
+
+
+def read_preview(file_path, job):
+    """Background job: read an Excel file for a preview table."""
+    from workbook_cache import read_excel_cached
+    job.progress.plan([("Reading file", 1)])
+    job.progress.stage("Reading file")
+    df = read_excel_cached(file_path)
+    job.progress.finish()
+    return df
+
+
+def compare_files(afc_path, triffy_path, save_path, job, archive=False):
+    """Background job: compare_files, or compare_files_streaming for very large exports."""
+    from compare_pipeline import compare_files, compare_files_streaming, should_stream
+    job_fn = compare_files_streaming if should_stream(afc_path, triffy_path) else compare_files
+    return job_fn(afc_path, triffy_path, save_path, job=job, archive=archive)
+
+
+def identify_settlement_files(paths, config, job):
+    from schema_detect import identify_settlement_files
+    return identify_settlement_files(paths, config, job=job)
+
+
+def build_summary(*args, job, **kwargs):
+    from settlement_pipeline import build_summary
+    return build_summary(*args, job=job, **kwargs)
+
+
+def build_merged_doc(*args, job, **kwargs):
+    from settlement_pipeline import build_merged_doc
+    return build_merged_doc(*args, job=job, **kwargs)
+
+
+def build_all_outputs(*args, job, **kwargs):
+    from settlement_pipeline import build_all_outputs
+    return build_all_outputs(*args, job=job, **kwargs)
+
+
+def process_bank_statement(*args, job, **kwargs):
+    from bank_pipeline import process_bank_statement
+    return process_bank_statement(*args, job=job, **kwargs)
+
+
+def read_action_sheets(file_path, job):
+    from row_remover_pipeline import read_action_sheets
+    return read_action_sheets(file_path, job=job)
+
+
+def remove_action_rows(*args, job, **kwargs):
+    from row_remover_pipeline import remove_action_rows
+    return remove_action_rows(*args, job=job, **kwargs)
+
+
+def search_archive(text, app, date_from, date_to, job):
+    from results_archive import search_archive
+    return search_archive(text, app, date_from, date_to, job=job)
+
+
+def archive_apps(job):
+    from results_archive import archive_apps
+    return archive_apps(job=job)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+
+class KeyIndex:
+    """
+    Integer codes for the ticket keys taking part in one comparison.
+    - Built once from every key column involved (e.g. the AFC TicketNUmber
+      and the Triffy ticket_number), so equal keys get equal codes across frames
+    - Codes follow the sorted order of the keys with NaN last, the order
+      pd.merge gives an outer join, so sorting by code sorts by key
+    - NaN is a key of its own, matching NaN like pd.merge does
+    Joins and duplicate checks then work on int arrays instead of hashing
+    the strings again for every merge.
+    """
+    def __init__(self, *keys):
+        sizes = [len(key) for key in keys]
+        values = pd.concat([pd.Series(np.asarray(key, dtype=object)) for key in keys], ignore_index=True) \
+            if keys else pd.Series([], dtype=object)
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        rank, sorted_keys = _sorted_ranks(uniques)
+        # Missing keys (factorized as -1) get the code after the last real key
+        codes = np.append(rank, len(rank))[codes]
+        if (codes == len(rank)).any():
+            sorted_keys = np.append(sorted_keys, np.nan)
+        self.keys = pd.Index(sorted_keys, dtype=object)
+        self._codes = np.split(codes, np.cumsum(sizes)[:-1]) if keys else []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def codes(self, position):
+        """Codes of the position-th key column passed to the constructor."""
+        return self._codes[position]
+
+    def encode(self, values):
+        """Codes of other values; -1 for keys that are not in the index."""
+        return self.keys.get_indexer(pd.Index(np.asarray(values, dtype=object)))
+
+    def decode(self, codes):
+        return self.keys.take(codes).to_numpy()
+
+
+def _sorted_ranks(uniques):
+    """
+    Position of every unique key in sorted order, and the sorted keys.
+    Ticket numbers are all text, and numpy sorts a fixed-width copy of
+    them several times faster than comparing the Python strings one by one.
+    """
+    uniques = np.asarray(uniques, dtype=object)
+    if pd.api.types.infer_dtype(uniques, skipna=False) == 'string':
+        order = np.argsort(uniques.astype(str), kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank, uniques[order]
+    rank, keys = pd.factorize(uniques, sort=True)
+    return rank.astype(np.int64), np.asarray(keys, dtype=object)
+
+
+def duplicated_codes(codes, size=None):
+    """Mask of the rows whose code occurs more than once, like Series.duplicated(keep=False)."""
+    counts = np.bincount(codes, minlength=size or 0) if len(codes) else np.zeros(0, dtype=np.int64)
+    return counts[codes] > 1
+
+
+def outer_join_rows(left_codes, right_codes):
+    """
+    Row pairs of a full outer join on integer codes, in the order pd.merge
+    produces them: sorted by code, left rows in their order within a code,
+    each one repeated for its right matches in right order.
+    Returns (left_rows, right_rows) with -1 where a row has no partner.
+    """
+    left_codes = np.asarray(left_codes, dtype=np.int64)
+    right_codes = np.asarray(right_codes, dtype=np.int64)
+    size = int(max(left_codes.max(initial=-1), right_codes.max(initial=-1))) + 1
+
+    # Right rows grouped by code: the matches of code c are
+    # right_sorted[right_start[c]:right_start[c] + right_count[c]]
+    right_count = np.bincount(right_codes, minlength=size)
+    right_start = np.cumsum(right_count) - right_count
+    right_sorted = np.argsort(right_codes, kind='stable')
+
+    # Every left row once per right match, or once with no match
+    matches = right_count[left_codes]
+    repeats = np.maximum(matches, 1)
+    left_rows = np.repeat(np.arange(len(left_codes)), repeats)
+    offsets = np.arange(len(left_rows)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    matched = np.repeat(matches, repeats) > 0
+    right_rows = np.full(len(left_rows), -1)
+    right_rows[matched] = right_sorted[(np.repeat(right_start[left_codes], repeats) + offsets)[matched]]
+
+    # Right rows whose code never occurs on the left
+    on_left = np.zeros(size, dtype=bool)
+    on_left[left_codes] = True
+    right_only = np.flatnonzero(~on_left[right_codes])
+
+    codes = np.concatenate([left_codes[left_rows], right_codes[right_only]])
+    order = np.argsort(codes, kind='stable')
+    left_rows = np.concatenate([left_rows, np.full(len(right_only), -1)])[order]
+    right_rows = np.concatenate([right_rows, right_only])[order]
+    return left_rows, right_rows
+
+
+def outer_join(left, right, left_codes, right_codes, on=(), indicator=False):
+    """
+    Full outer join of two frames on precomputed key codes, equivalent to
+    pd.merge(left, right, how='outer') on the keys the codes were built from.
+    - on: key columns present in both frames; they are coalesced into one
+      column, all other column names must be distinct
+    - indicator: add a '_merge' column like pd.merge(indicator=True)
+    """
+    overlap = (set(left.columns) & set(right.columns)) - set(on)
+    if overlap:
+        raise ValueError(f"Columns present in both frames: {sorted(overlap)}")
+
+    left_rows, right_rows = outer_join_rows(left_codes, right_codes)
+
+    # Reindexing with -1 yields all-missing rows, upcast like pd.merge does
+    left_part = left.reset_index(drop=True).reindex(left_rows).reset_index(drop=True)
+    right_part = right.reset_index(drop=True).reindex(right_rows).reset_index(drop=True)
+    for column in on:
+        left_values, right_values = left_part[column], right_part[column]
+        if isinstance(left_values.dtype, pd.CategoricalDtype) or isinstance(right_values.dtype, pd.CategoricalDtype):
+            # A categorical only takes values from its categories
+            left_values, right_values = left_values.astype(object), right_values.astype(object)
+        left_part[column] = left_values.where(left_rows >= 0, right_values)
+    joined = pd.concat([left_part, right_part.drop(columns=list(on))], axis=1)
+
+    if indicator:
+        merge_side = np.where(left_rows < 0, 'right_only', np.where(right_rows < 0, 'left_only', 'both'))
+        joined['_merge'] = pd.Categorical(merge_side, categories=['left_only', 'right_only', 'both'])
+    return joined
@@ -0,0 +1,33 @@
+import logging
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+
+class LazyTab(QWidget):
+    """
+    Stand-in for a tab that builds the real one the first time it is shown.
+    - factory() returns the real tab; it should import the tab's module
+      itself, so that nothing of an unopened tab is loaded at all
+    - widget() builds the tab on demand, e.g. for code that needs it before
+      the user opens it
+    """
+    def __init__(self, name, factory):
+        super().__init__()
+        self.name = name
+        self._factory = factory
+        self._widget = None
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    def widget(self):
+        if self._widget is None:
+            with span(log, "tab", tab=self.name):
+                self._widget = self._factory()
+            self._layout.addWidget(self._widget)
+        return self._widget
+
+    def showEvent(self, event):
+        self.widget()
+        super().showEvent(event)
@@ -1,5 +1,5 @@
-from PyQt5.QtWidgets import QWidget, QProgressBar, QLabel, QVBoxLayout
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QWidget, QProgressBar, QLabel, QVBoxLayout, QPushButton
+from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPainter, QColor
 
 class LoadingOverlay(QWidget):
@@ -30,6 +30,16 @@ class LoadingOverlay(QWidget):
             QProgressBar::chunk {
                 background-color: #4CAF50;
             }
+            QPushButton {
+                background-color: #f44336;
+                color: white;
+                border: none;
+                padding: 6px 16px;
+                border-radius: 4px;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+            }
         """)
         
         # Create layout
@@ -46,33 +56,77 @@ class LoadingOverlay(QWidget):
         self.progress_bar.setRange(0, 100)
         layout.addWidget(self.progress_bar, alignment=Qt.AlignCenter)
         
-        self.setLayout(layout)
+        # Add detail label for rows processed, throughput and ETA
+        self.detail_label = QLabel("")
+        layout.addWidget(self.detail_label, alignment=Qt.AlignCenter)
         
-        # Timer for simulating progress
-        self.timer = QTimer()
-        self.timer.timeout.connect(self._update_progress)
+        # Add cancel button, only shown for cancellable background jobs
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self._cancel_job)
+        self.cancel_button.hide()
+        layout.addWidget(self.cancel_button, alignment=Qt.AlignCenter)
+        
+        self.setLayout(layout)
+        self.job = None
+        self.message = ""
         self.current_progress = 0
     
-    def start_loading(self, message="Processing..."):
+    def start_loading(self, message="Processing...", job=None):
+        self.message = message
         self.label.setText(message)
+        self.detail_label.setText("")
         self.progress_bar.setValue(0)
         self.current_progress = 0
+        
+        # Follow a background job's progress and let the user cancel it
+        self.job = job
+        if job is not None:
+            job.signals.progress.connect(self._on_job_progress)
+            self.cancel_button.setEnabled(True)
+            self.cancel_button.show()
+        else:
+            self.cancel_button.hide()
+        
         self.show()
-        self.timer.start(50)  # Update every 50ms
+        self.raise_()
         
     def stop_loading(self):
-        self.timer.stop()
+        self.job = None
+        self.cancel_button.hide()
         self.hide()
     
-    def _update_progress(self):
-        if self.current_progress < 95:  # Cap at 95% until operation completes
-            self.current_progress += 1
-            self.progress_bar.setValue(self.current_progress)
-    
     def set_progress(self, value):
         self.current_progress = value
         self.progress_bar.setValue(value)
     
+    def _on_job_progress(self, update):
+        # Ignore late updates from a job this overlay is no longer showing
+        if self.job is None or self.sender() is not self.job.signals or self.job.is_cancelled():
+            return
+        
+        self.label.setText(f"{self.message}\n{update.stage}" if update.stage else self.message)
+        self.set_progress(update.percent)
+        
+        # Rows done out of total, throughput and time remaining
+        details = []
+        if update.done:
+            if update.total:
+                details.append(f"{update.done:,} / {update.total:,} {update.unit}")
+            else:
+                details.append(f"{update.done:,} {update.unit}")
+        if update.rate:
+            details.append(f"{update.rate:,.0f} {update.unit}/s")
+        if update.eta is not None:
+            minutes, seconds = divmod(int(update.eta), 60)
+            details.append(f"ETA {minutes}:{seconds:02d}")
+        self.detail_label.setText("  ·  ".join(details))
+    
+    def _cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_button.setEnabled(False)
+            self.label.setText("Cancelling...")
+    
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.fillRect(self.rect(), QColor(0, 0, 0, 100))
@@ -1,26 +1,56 @@
+import time
+_STARTED = time.perf_counter()  # before any other import, for the startup report
+
 import sys
-import os
-import json
+from multiprocessing import freeze_support
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
-from excel_compare import ExcelUploader
-from settlement_process import SingleFileUploader
-from bank_stm import BankStatementProcessor
-from row_remover import ConsolidateUploader
-from settings import SettingsTab
+from lazy_tab import LazyTab
+from app_config import config_file_path, load_config
+from tracing import configure_logging
+from startup import StartupTimer
+
+
+# Tab factories. Each imports its module when the tab is first shown, so
+# the window opens without loading the tabs nobody looked at, or pandas.
+
+def _compare_tab():
+    from excel_compare import ExcelUploader
+    return ExcelUploader()
+
+
+def _settlement_tab(app_names):
+    from settlement_process import SingleFileUploader
+    return SingleFileUploader(app_names)
+
+
+def _bank_statement_tab():
+    from bank_stm import BankStatementProcessor
+    return BankStatementProcessor()
+
+
+def _history_tab():
+    from history_tab import HistoryTab
+    return HistoryTab()
+
+
+def _settings_tab(config_path):
+    from settings import SettingsTab
+    return SettingsTab(config_path)
+
+
+def _row_remover_tab():
+    from row_remover import ConsolidateUploader
+    return ConsolidateUploader()
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        
-        # Initialize config file path first
-        appdata_dir = os.getenv("APPDATA") if os.name == "nt" else os.path.expanduser("~/.config")
-        app_folder = os.path.join(appdata_dir, "kochimetro")
-        os.makedirs(app_folder, exist_ok=True)
-        self.config_file_path = os.path.join(app_folder, "config.json")
-        
-        # Now load the config
+
+        # Load the config, creating it with the defaults on first start
         self.config_file_path, self.config = self.load_config()
-        
+
         # Initialize UI
         self.setWindowTitle("Data Consolidator")
         self.setGeometry(100, 100, 1200, 800)
@@ -29,50 +59,41 @@ class MainWindow(QMainWindow):
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
 
-        # Create instances of each tab
-        self.excel_compare_tab = ExcelUploader()
-        self.single_file_tab = SingleFileUploader(list(self.config.keys()))
-        self.settings_tab = SettingsTab(self.config_file_path)
-        self.row_remover_tab = ConsolidateUploader()
-        self.bank_statement_tab = BankStatementProcessor()
+        # Create each tab; they are built the first time they are shown
+        app_names = list(self.config.keys())
+        self.excel_compare_tab = LazyTab("Compare", _compare_tab)
+        self.single_file_tab = LazyTab("Settlement", lambda: _settlement_tab(app_names))
+        self.settings_tab = LazyTab("Settings", lambda: _settings_tab(self.config_file_path))
+        self.row_remover_tab = LazyTab("Row Remover", _row_remover_tab)
+        self.bank_statement_tab = LazyTab("Bank Statement", _bank_statement_tab)
+        self.history_tab = LazyTab("History", _history_tab)
 
         # Add tabs to the widget
-        self.tabs.addTab(self.excel_compare_tab, "Compare")
-        self.tabs.addTab(self.single_file_tab, "Settlement")
-        self.tabs.addTab(self.bank_statement_tab, "Bank Statement")
-        self.tabs.addTab(self.settings_tab, "Settings")
-        self.tabs.addTab(self.row_remover_tab, "Row Remover")
+        for tab in [self.excel_compare_tab, self.single_file_tab, self.bank_statement_tab,
+                    self.history_tab, self.settings_tab, self.row_remover_tab]:
+            self.tabs.addTab(tab, tab.name)
 
     def load_config(self):
-        # Get AppData directory
-        appdata_dir = os.getenv("APPDATA") if os.name == "nt" else os.path.expanduser("~/.config")
-        app_folder = os.path.join(appdata_dir, "kochimetro")
-        os.makedirs(app_folder, exist_ok=True)
-        config_path = os.path.join(app_folder, "config.json")
-
-        # Load or create config.json
-        if os.path.exists(config_path):
-            with open(config_path, "r") as file:
-                config = json.load(file)
-        else:
-            # Default configuration
-            config = {
-                'easemytrip': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
-                'nammayathri': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'Total Amount', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
-                'phonepe': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
-                'paytm': {'id_col': 'Operator Reference Number', 'match_col': 'order_id', 'amount_col': 'Total Price', 'settle_col': 'Payable Amount', 'date_col': 'Settlement Date'},
-                'rapido': {'id_col': 'Network Order ID', 'match_col': 'transaction_ref_no', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'},
-                'redbus': {'id_col': 'Network Order ID(From ondcTxnId)', 'match_col': 'transaction_ref_no', 'amount_col': 'TOTAL AMOUNT', 'settle_col': 'Settlement Amount', 'date_col': 'Date'}
-            }
-
-            # Save the default configuration to the file
-            with open(config_path, "w") as file:
-                json.dump(config, file, indent=4)
-
-        return config_path, config
+        config_path = config_file_path()
+        return config_path, load_config(config_path)
 
 if __name__ == "__main__":
+    # Settlement worker processes re-run this executable in a frozen build
+    freeze_support()
+    configure_logging()
+    startup = StartupTimer(_STARTED)
+    startup.mark("imports")
     app = QApplication(sys.argv)
+    startup.mark("qapplication")
     main_window = MainWindow()
     main_window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    startup.mark("window")
+
+    def first_paint():
+        # Runs once the event loop has shown and painted the window
+        startup.mark("shown")
+        if startup.finish():
+            app.quit()
+
+    QTimer.singleShot(0, first_paint)
+    sys.exit(app.exec_())
@@ -0,0 +1,89 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+from xlsx_export import frame_rows
+
+
+class PartitionStore:
+    """
+    Temporary on-disk buckets for data sets larger than memory.
+    - Rows are assigned to one of `partitions` buckets by a hash of their
+      key, so equal keys from different inputs always share a bucket
+    - Each (name, partition) bucket is a file of pickled DataFrame pieces,
+      appended to as chunks arrive and read back piece by piece
+    - The directory is deleted by close() or when used as a context manager
+    """
+    def __init__(self, partitions, directory=None):
+        self.partitions = partitions
+        self.directory = tempfile.mkdtemp(prefix="partitions-", dir=directory)
+        self._schemas = {}  # name -> empty frame with the columns and dtypes of the first piece
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def partition_of(self, keys):
+        """Bucket number of every key; stable across runs and processes."""
+        values = np.asarray(keys, dtype=object)
+        return (pd.util.hash_array(values) % np.uint64(self.partitions)).astype(np.int64)
+
+    def scatter(self, name, df, keys):
+        """Append the rows of df to the `name` buckets of their keys."""
+        self._schemas.setdefault(name, df.iloc[:0])
+        partition = self.partition_of(keys)
+        order = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+        for p in range(self.partitions):
+            rows = order[bounds[p]:bounds[p + 1]]
+            if len(rows):
+                self.append(name, p, df.iloc[rows])
+
+    def append(self, name, partition, df):
+        """Append df as one piece of bucket (name, partition)."""
+        self._schemas.setdefault(name, df.iloc[:0])
+        with open(self._path(name, partition), "ab") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def iter_pieces(self, name, partition):
+        path = self._path(name, partition)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def load(self, name, partition):
+        """The whole bucket as one frame; empty with the right columns if nothing was stored."""
+        pieces = list(self.iter_pieces(name, partition))
+        if not pieces:
+            return self._schemas.get(name, pd.DataFrame()).copy()
+        return pd.concat(pieces, ignore_index=True) if len(pieces) > 1 else pieces[0].reset_index(drop=True)
+
+    def merged_rows(self, name, key_position=0):
+        """
+        Cell-value rows of all `name` buckets in key order, assuming every
+        bucket was stored sorted by the value at key_position. Only one
+        piece per bucket is in memory at a time.
+        """
+        streams = [
+            (row for piece in self.iter_pieces(name, p) for row in frame_rows(piece))
+            for p in range(self.partitions)
+        ]
+        return heapq.merge(*streams, key=itemgetter(key_position))
+
+    def _path(self, name, partition):
+        return os.path.join(self.directory, f"{name}_{partition}.pkl")
@@ -0,0 +1,113 @@
+import logging
+import time
+from collections import namedtuple
+from tracing import emit
+
+log = logging.getLogger(__name__)
+
+
+ProgressUpdate = namedtuple(
+    "ProgressUpdate",
+    ["percent", "stage", "done", "total", "unit", "rate", "eta"]
+)
+
+
+class ProgressReporter:
+    """
+    Reports what a pipeline is actually doing.
+    - plan() declares the stages up front with a relative weight each
+    - stage() starts a stage, optionally with the number of rows/files it covers
+    - update()/advance() report how many of those have been processed
+
+    Every report is turned into a ProgressUpdate (overall percent, stage label,
+    done/total, throughput per second and ETA in seconds) and handed to the
+    callback. Without a callback nothing is reported, so pipelines can
+    always report progress whether or not anyone is listening.
+
+    Each finished stage is also logged as a span with its duration and the
+    number of rows/files it covered.
+    """
+    def __init__(self, callback=None):
+        self._callback = callback
+        self._weights = {}
+        self._total_weight = 0
+        self._completed_weight = 0
+        self._started_at = time.monotonic()
+        self._stage = None
+        self._stage_started_at = self._started_at
+        self._done = 0
+        self._total = None
+        self._unit = "rows"
+
+    def plan(self, stages):
+        """Declare the stages as (label, weight) pairs, in running order."""
+        self._weights = dict(stages)
+        self._total_weight = sum(self._weights.values())
+        self._completed_weight = 0
+        self._started_at = time.monotonic()
+
+    def stage(self, label, total=None, unit="rows"):
+        self._complete_current_stage()
+        self._stage = label
+        self._stage_started_at = time.monotonic()
+        self._done = 0
+        self._total = total
+        self._unit = unit
+        self._emit()
+
+    def update(self, done, total=None):
+        self._done = done
+        if total is not None:
+            self._total = total
+        self._emit()
+
+    def advance(self, count=1):
+        self.update(self._done + count)
+
+    def finish(self):
+        self._complete_current_stage()
+        self._stage = None
+        self._completed_weight = self._total_weight
+        self._emit()
+
+    @property
+    def percent(self):
+        if not self._total_weight:
+            return 0
+        weight = self._completed_weight
+        if self._stage is not None and self._total:
+            fraction = min(self._done / self._total, 1.0)
+            weight += self._weights.get(self._stage, 0) * fraction
+        return min(int(100 * weight / self._total_weight), 100)
+
+    def _complete_current_stage(self):
+        if self._stage is not None:
+            self._completed_weight += self._weights.get(self._stage, 0)
+            fields = {self._unit: self._total} if self._total is not None else {}
+            emit(log, logging.INFO, self._stage, time.monotonic() - self._stage_started_at, fields)
+            self._stage = None
+
+    def _emit(self):
+        if self._callback is None:
+            return
+
+        now = time.monotonic()
+        stage_elapsed = now - self._stage_started_at
+        rate = self._done / stage_elapsed if self._done and stage_elapsed > 0 else None
+
+        # Estimate the remaining time from overall progress so far
+        percent = self.percent
+        eta = None
+        if 0 < percent < 100:
+            elapsed = now - self._started_at
+            eta = elapsed * (100 - percent) / percent
+
+        self._callback(ProgressUpdate(
+            percent=percent,
+            stage=self._stage,
+            done=self._done,
+            total=self._total,
+            unit=self._unit,
+            rate=rate,
+            eta=eta,
+        ))
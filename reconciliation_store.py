@@ -0,0 +1,252 @@
+"""
+Results of earlier settlement runs, kept so that the daily run over the
+month-to-date files only redoes what changed since the previous one.
+
+The AFC-triffi rows and the settlement records of every app are split into
+partitions by (ONDCapp, day): insertDT for the AFC-triffi rows, the
+settlement date for the records. The store keeps, per partition, a
+fingerprint of its rows and the match keys in it, and per (ONDCapp, match
+key) the rows the join produced. A run then
+
+    1. fingerprints the partitions of its inputs
+    2. collects the keys of every partition whose fingerprint changed, both
+       as the partition is now and as it was stored
+    3. joins the rows of those keys only and replaces their stored rows
+    4. reads all joined rows back, in the order a full join gives them
+
+A ticket is often settled a day or more after it was sold, so a match can
+cross partitions: changed keys, not changed days, are re-joined. The
+partitions and joined rows of an app are dropped when its mapping changes.
+"""
+import json
+import logging
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from app_config import app_folder
+from key_index import KeyIndex
+from date_formats import format_days
+
+log = logging.getLogger(__name__)
+
+# Bump when the stored layout or the join rules change, so the state written
+# by an older version is discarded instead of merged with
+FORMAT_VERSION = 2
+
+STATE_FILE = os.getenv("KOCHIMETRO_SETTLEMENT_STATE") or os.path.join(app_folder(), "reconciliation.sqlite")
+
+# Stands in for a missing match key, which is a key of its own in the join
+# but would never equal itself as SQL NULL
+_MISSING_KEY = "\x00"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS apps (app TEXT PRIMARY KEY, mapping TEXT);
+CREATE TABLE IF NOT EXISTS partitions (
+    app TEXT, side TEXT, day TEXT, fingerprint TEXT, PRIMARY KEY (app, side, day));
+CREATE TABLE IF NOT EXISTS partition_keys (app TEXT, side TEXT, day TEXT, key TEXT);
+CREATE INDEX IF NOT EXISTS partition_keys_part ON partition_keys (app, side, day);
+"""
+
+
+class ReconciliationStore:
+    """
+    SQLite file with the state of earlier settlement runs.
+    - merge() is the incremental counterpart of one join over all apps
+    - Use as a context manager, or close() when done; a connection belongs
+      to the thread that opened it
+    """
+    def __init__(self, path=None):
+        self.path = path or STATE_FILE
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.executescript(_SCHEMA)
+        if self._meta("version") != str(FORMAT_VERSION):
+            self._reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._conn.close()
+
+    def merge(self, app_data, settlement_data, mappings, join):
+        """
+        Same rows as join(app_data, settlement_data), re-joining only the
+        keys of changed partitions.
+        - app_data, settlement_data: the AFC-triffi rows and the settlement
+          records, both with ONDCapp and match_key; days are taken from
+          insertDT and settlement_date
+        - mappings: {app: mapping} of the apps taking part, in join order
+        - join: the full join, called with the rows of the changed keys; its
+          result is grouped by app in mappings order and sorted by key
+        """
+        apps = list(mappings)
+        rows = pd.concat([_partition_rows(app_data, 'insertDT', 'afc'),
+                          _partition_rows(settlement_data, 'settlement_date', 'settlement')],
+                         ignore_index=True)
+        current = rows.groupby('part', sort=False).agg(
+            app=('app', 'first'), side=('side', 'first'), day=('day', 'first'),
+            hash_sum=('hash', 'sum'), size=('hash', 'size'))
+        current['fingerprint'] = current['size'].astype(str) + ":" + current['hash_sum'].astype(str)
+
+        with self._conn:
+            self._forget_changed_apps(mappings)
+            stored = pd.read_sql_query(
+                f"SELECT app, side, day, fingerprint FROM partitions WHERE app IN ({_placeholders(apps)})",
+                self._conn, params=apps)
+            stored.index = _part_ids(stored['app'], stored['side'], stored['day'])
+            fingerprints = pd.concat([current['fingerprint'].rename('now'),
+                                      stored['fingerprint'].rename('before')], axis=1)
+            changed = fingerprints.index[fingerprints['now'] != fingerprints['before']]
+
+            # Keys to re-join: those in the changed partitions now and before
+            in_changed = rows['part'].isin(changed).to_numpy()
+            self._fill_temp("changed_parts", ["app", "side", "day"],
+                            stored.loc[stored.index.isin(changed), ['app', 'side', 'day']].itertuples(index=False))
+            before = pd.read_sql_query(
+                "SELECT DISTINCT k.app, k.key FROM partition_keys k "
+                "JOIN temp.changed_parts c USING (app, side, day)", self._conn)
+            changed_ids = pd.Index(rows.loc[in_changed, 'id']).union(
+                pd.Index(before['app'] + "\x1f" + before['key']))
+            rejoin = rows['id'].isin(changed_ids).to_numpy()
+            log.info("Incremental settlement: %d of %d partitions changed, re-joining %d keys (%d of %d rows)",
+                     len(changed), len(fingerprints), len(changed_ids), rejoin.sum(), len(rows))
+
+            # Replace the rows of the changed keys
+            key_pairs = [tuple(key_id.split("\x1f", 1)) for key_id in changed_ids]
+            self._fill_temp("changed_keys", ["app", "key"], key_pairs)
+            if self._has_rows_table():
+                self._conn.execute('DELETE FROM joined_rows WHERE ("ONDCapp", match_key) IN '
+                                   '(SELECT app, key FROM temp.changed_keys)')
+            if rejoin.any():
+                joined = join(app_data[rejoin[:len(app_data)]], settlement_data[rejoin[len(app_data):]])
+                self._insert_rows(joined)
+
+            # Record the partitions as they are now
+            self._conn.execute("DELETE FROM partitions WHERE (app, side, day) IN "
+                               "(SELECT app, side, day FROM temp.changed_parts)")
+            self._conn.execute("DELETE FROM partition_keys WHERE (app, side, day) IN "
+                               "(SELECT app, side, day FROM temp.changed_parts)")
+            now = current.loc[current.index.isin(changed), ['app', 'side', 'day', 'fingerprint']]
+            self._conn.executemany("INSERT INTO partitions VALUES (?, ?, ?, ?)", now.itertuples(index=False))
+            keys = rows.loc[in_changed, ['app', 'side', 'day', 'key']].drop_duplicates()
+            self._conn.executemany("INSERT INTO partition_keys VALUES (?, ?, ?, ?)", keys.itertuples(index=False))
+
+        if not self._has_rows_table():
+            # Nothing joined yet, as on a first run without rows: the join of
+            # these (empty) inputs has the columns to return
+            return join(app_data, settlement_data)
+        return self._read_rows(apps)
+
+    def _forget_changed_apps(self, mappings):
+        stored = dict(self._conn.execute("SELECT app, mapping FROM apps"))
+        for app, mapping in mappings.items():
+            mapping = json.dumps(mapping, sort_keys=True)
+            if stored.get(app) == mapping:
+                continue
+            if app in stored:
+                log.info("Mapping of %s changed, its stored results are discarded", app)
+            for table, column in [("partitions", "app"), ("partition_keys", "app"), ("joined_rows", '"ONDCapp"')]:
+                if table != "joined_rows" or self._has_rows_table():
+                    self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (app,))
+            self._conn.execute("INSERT OR REPLACE INTO apps VALUES (?, ?)", (app, mapping))
+
+    def _insert_rows(self, joined):
+        columns = list(joined.columns)
+        if not self._has_rows_table():
+            float_columns = [column for column in columns if joined[column].dtype.kind == 'f']
+            date_columns = [column for column in columns if joined[column].dtype.kind == 'M']
+            quoted = ", ".join(_quote(column) for column in columns)
+            self._conn.execute(f"CREATE TABLE joined_rows ({quoted}, seq INTEGER)")
+            self._conn.execute('CREATE INDEX joined_rows_key ON joined_rows ("ONDCapp", match_key)')
+            self._set_meta("columns", json.dumps(columns))
+            self._set_meta("float_columns", json.dumps(float_columns))
+            self._set_meta("date_columns", json.dumps(date_columns))
+        elif json.loads(self._meta("columns")) != columns:
+            raise ValueError(f"Joined columns changed from {self._meta('columns')} to {columns}; "
+                             f"bump FORMAT_VERSION")
+
+        # Days are stored as YYYY-MM-DD text
+        days = {column: format_days(joined[column]) for column in joined.columns if joined[column].dtype.kind == 'M'}
+        values = joined.assign(**days).astype(object).where(joined.notna(), None)
+        values['match_key'] = _encode_keys(joined['match_key'])
+        values['seq'] = np.arange(len(values)).tolist()
+        self._conn.executemany(
+            f"INSERT INTO joined_rows VALUES ({_placeholders(values.columns)})",
+            values.itertuples(index=False, name=None))
+
+    def _read_rows(self, apps):
+        frame = pd.read_sql_query(
+            f'SELECT * FROM joined_rows WHERE "ONDCapp" IN ({_placeholders(apps)})', self._conn, params=apps)
+        frame = frame.astype({column: 'float64' for column in json.loads(self._meta("float_columns"))})
+        frame = frame.where(frame.notna(), np.nan)
+        for column in json.loads(self._meta("date_columns")):
+            frame[column] = pd.to_datetime(frame[column], format='%Y-%m-%d')
+        frame['match_key'] = frame['match_key'].mask(frame['match_key'] == _MISSING_KEY, np.nan)
+
+        # Same order as the full join: by app, key, then as joined
+        key_index = KeyIndex(frame['match_key'])
+        app_rank = frame['ONDCapp'].map({app: rank for rank, app in enumerate(apps)}).to_numpy(dtype=np.int64)
+        order = np.lexsort((frame['seq'].to_numpy(), key_index.codes(0), app_rank))
+        return frame.drop(columns='seq').take(order).reset_index(drop=True)
+
+    def _has_rows_table(self):
+        return self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'joined_rows'").fetchone() is not None
+
+    def _fill_temp(self, table, columns, rows):
+        self._conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        self._conn.execute(f"DELETE FROM temp.{table}")
+        self._conn.executemany(f"INSERT INTO temp.{table} VALUES ({_placeholders(columns)})", rows)
+
+    def _meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+
+    def _reset(self):
+        with self._conn:
+            for table in ["apps", "partitions", "partition_keys", "meta"]:
+                self._conn.execute(f"DELETE FROM {table}")
+            # settlement_dates held the date memo of version 1
+            self._conn.execute("DROP TABLE IF EXISTS settlement_dates")
+            self._conn.execute("DROP TABLE IF EXISTS joined_rows")
+            self._set_meta("version", str(FORMAT_VERSION))
+
+
+def _partition_rows(frame, day_col, side):
+    """One row per input row: its partition, key and a hash of all its values."""
+    app = frame['ONDCapp'].astype(str).to_numpy(dtype=object)
+    day = format_days(frame[day_col]).astype(str).to_numpy(dtype=object)
+    key = _encode_keys(frame['match_key'])
+    return pd.DataFrame({
+        'app': app, 'side': side, 'day': day, 'key': key,
+        'part': _part_ids(app, side, day),
+        'id': app + "\x1f" + key,
+        'hash': pd.util.hash_pandas_object(frame, index=False).to_numpy(),
+    })
+
+
+def _part_ids(app, side, day):
+    return np.asarray(app, dtype=object) + "\x1f" + np.asarray(side, dtype=object) + "\x1f" + np.asarray(day, dtype=object)
+
+
+def _encode_keys(keys):
+    keys = pd.Series(np.asarray(keys, dtype=object))
+    return keys.where(keys.notna(), _MISSING_KEY).astype(str).to_numpy(dtype=object)
+
+
+def _placeholders(columns):
+    return ", ".join("?" * len(columns))
+
+
+def _quote(column):
+    return '"' + str(column).replace('"', '""') + '"'
@@ -0,0 +1,203 @@
+"""
+History of reconciliation results: the Errors and Equal rows of compare
+runs and the merged rows of settlement runs, kept in an indexed SQLite file
+so that a ticket, order or transaction can be looked up across months
+without reopening old workbooks.
+
+A run replaces what earlier runs stored for the same tickets (compare) or
+the same app and day (settlement), so re-running the month-to-date files
+every day keeps one row per ticket instead of one per run. Nothing a run
+added is kept unless it completes.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from datetime import datetime
+import pandas as pd
+from app_config import app_folder
+from date_formats import format_days
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_FILE = os.getenv("KOCHIMETRO_ARCHIVE") or os.path.join(app_folder(), "results.sqlite")
+
+# Progress stage of the pipelines while they archive their results
+ARCHIVE_STAGE = ("Archiving results", 10)
+
+# Most rows a lookup returns; a filter on the app alone can match millions
+QUERY_LIMIT = 1000
+
+# Indexes of every archived table; (ONDCapp, insertDT) serves lookups by app
+# with or without dates
+INDEXES = [['TicketNUmber'], ['order_id'], ['transaction_ref_no'], ['insertDT'], ['ONDCapp', 'insertDT']]
+
+# An archived table.
+# - columns: kept from the frames a pipeline hands over, missing ones as NULL
+# - replace_by: a run first deletes the earlier rows with its values of these
+ArchiveTable = namedtuple("ArchiveTable", ["name", "columns", "replace_by"])
+
+TABLES = {
+    'compare': ArchiveTable('compare_rows', [
+        'sheet', 'TicketNUmber', 'QRCodeId', 'insertDT', 'FromStation', 'To Station',
+        'total_amount', 'QRCodePrice', 'ONDCapp', 'transaction_ref_no', 'order_id',
+        'booking_status', 'descCode', 'Remark'
+    ], ['TicketNUmber']),
+    'settlement': ArchiveTable('settlement_rows', [
+        'insertDT', 'TicketNUmber', 'order_id', 'transaction_ref_no', 'ONDCapp',
+        'total_amount', 'QRCodePrice', 'booking_status', 'descCode', 'Remark',
+        'amount_col', 'settle_col', 'unsettled', 'comment_col', 'result'
+    ], ['ONDCapp', 'insertDT']),
+}
+
+
+class ResultsArchive:
+    """
+    SQLite file with the results of earlier runs.
+    - begin_run(), add_rows() for every frame of the run, then commit();
+      rows of a run that is not committed are rolled back on close()
+    - lookup() finds rows by id, app and insertDT range through the indexes
+    - A connection belongs to the thread that opened it
+    """
+    def __init__(self, path=None):
+        self.path = path or ARCHIVE_FILE
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path)
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._conn.close()
+
+    def begin_run(self, kind, inputs):
+        """Record a run of kind 'compare' or 'settlement' over the input files; returns its id."""
+        cursor = self._conn.execute(
+            "INSERT INTO runs (kind, started, inputs) VALUES (?, ?, ?)",
+            (kind, datetime.now().isoformat(timespec='seconds'),
+             json.dumps([os.path.basename(path) for path in inputs])))
+        return cursor.lastrowid
+
+    def add_rows(self, run_id, kind, df, sheet=None):
+        """Store df for the run, replacing earlier runs' rows of the same tickets or days."""
+        table = TABLES[kind]
+        frame = df.reindex(columns=[column for column in table.columns if column != 'sheet'])
+        if 'sheet' in table.columns:
+            frame.insert(0, 'sheet', sheet)
+        # As text, so that ranges compare as text
+        frame['insertDT'] = format_days(frame['insertDT'])
+        values = frame.astype(object).where(frame.notna(), None)
+
+        replaced = values[table.replace_by].drop_duplicates()
+        self._conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS replaced_{table.name} "
+                           f"({', '.join(_quote(column) for column in table.replace_by)})")
+        self._conn.execute(f"DELETE FROM temp.replaced_{table.name}")
+        self._conn.executemany(f"INSERT INTO temp.replaced_{table.name} VALUES ({_placeholders(table.replace_by)})",
+                               replaced.itertuples(index=False, name=None))
+        # IS matches NULL to NULL too, so rows without a ticket or day are
+        # replaced like the others instead of piling up run after run
+        same_key = " AND ".join(f"t.{_quote(column)} IS r.{_quote(column)}" for column in table.replace_by)
+        self._conn.execute(f"DELETE FROM {table.name} WHERE rowid IN "
+                           f"(SELECT t.rowid FROM temp.replaced_{table.name} r "
+                           f"JOIN {table.name} t ON {same_key})")
+
+        self._conn.executemany(
+            f"INSERT INTO {table.name} VALUES (?, {_placeholders(table.columns)})",
+            ((run_id,) + row for row in values.itertuples(index=False, name=None)))
+        self._conn.execute("UPDATE runs SET row_count = row_count + ? WHERE run_id = ?", (len(values), run_id))
+
+    def commit(self):
+        self._conn.commit()
+
+    def lookup(self, text="", app=None, date_from=None, date_to=None, limit=QUERY_LIMIT):
+        """
+        Archived rows matching every filter given, newest run first, at most
+        limit of them:
+        - text: a TicketNUmber, order_id or transaction_ref_no, matched exactly
+        - app: ONDCapp, in any case
+        - date_from, date_to: inclusive insertDT range, as dates or YYYY-MM-DD
+        Each row comes with the kind and sheet it was archived from and the
+        start of its run.
+        """
+        frames = []
+        for kind, table in TABLES.items():
+            conditions, params = [], []
+            if text:
+                conditions.append('("TicketNUmber" = ? OR "order_id" = ? OR "transaction_ref_no" = ?)')
+                params += [text] * 3
+            if app:
+                conditions.append('"ONDCapp" = ?')
+                params.append(app)
+            if date_from:
+                conditions.append('"insertDT" >= ?')
+                params.append(str(date_from))
+            if date_to:
+                conditions.append('"insertDT" <= ?')
+                params.append(str(date_to))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            source = "'Compare ' || t.sheet" if 'sheet' in table.columns else "'Settlement'"
+            columns = ", ".join(f"t.{_quote(column)}" for column in table.columns if column != 'sheet')
+            frames.append(pd.read_sql_query(
+                f"SELECT {source} AS source, r.started AS run, {columns} FROM {table.name} t "
+                f"JOIN runs r USING (run_id) {where} ORDER BY t.run_id DESC LIMIT ?",
+                self._conn, params=params + [limit]))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=['source', 'run'])
+        # Each kind's newest limit rows hold the newest limit rows overall
+        rows = pd.concat(frames, ignore_index=True).sort_values('run', ascending=False, kind='stable')
+        return rows.head(limit)
+
+    def apps(self):
+        """Every ONDCapp in the archive, sorted."""
+        rows = self._conn.execute(" UNION ".join(
+            f'SELECT DISTINCT "ONDCapp" FROM {table.name} WHERE "ONDCapp" IS NOT NULL'
+            for table in TABLES.values()))
+        return sorted({app for app, in rows}, key=str.lower)
+
+    def _create_tables(self):
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, kind TEXT, "
+                               "started TEXT, inputs TEXT, row_count INTEGER DEFAULT 0)")
+            for table in TABLES.values():
+                # ONDCapp compares without case, in lookups and in its index
+                columns = ", ".join(_quote(column) + (" COLLATE NOCASE" if column == 'ONDCapp' else "")
+                                    for column in table.columns)
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table.name} (run_id INTEGER, {columns})")
+                for columns in INDEXES:
+                    self._conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table.name}_{'_'.join(columns)} "
+                        f"ON {table.name} ({', '.join(_quote(column) for column in columns)})")
+
+
+def search_archive(text, app, date_from, date_to, job):
+    """
+    Background job: ResultsArchive.lookup; returns (rows, seconds taken,
+    whether more than QUERY_LIMIT rows matched and the rest were left out).
+    """
+    started = time.perf_counter()
+    with ResultsArchive() as archive:
+        # One row more than shown tells whether there were more
+        rows = archive.lookup(text, app, date_from, date_to, limit=QUERY_LIMIT + 1)
+    return rows.head(QUERY_LIMIT), time.perf_counter() - started, len(rows) > QUERY_LIMIT
+
+
+def archive_apps(job):
+    """Background job: ResultsArchive.apps."""
+    with ResultsArchive() as archive:
+        return archive.apps()
+
+
+def _placeholders(columns):
+    return ", ".join("?" * len(columns))
+
+
+def _quote(column):
+    return '"' + str(column).replace('"', '""') + '"'
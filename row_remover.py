@@ -1,10 +1,12 @@
-import pandas as pd
+import os
 from PyQt5.QtWidgets import (
     QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QFileDialog, QMessageBox, QTableView, QCheckBox, QScrollArea
 )
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QStandardItemModel, QStandardItem
 from loading_overlay import LoadingOverlay
+from dataframe_model import DataFrameModel
+from workers import Worker, start_job
+from jobs import read_action_sheets, remove_action_rows
 
 
 class ConsolidateUploader(QWidget):
@@ -126,6 +128,9 @@ class ConsolidateUploader(QWidget):
         self.file_label.setCursor(Qt.PointingHandCursor)
         self.file_label.mousePressEvent = self.upload_file
         self.file_path = None
+        # Sheets read on upload, reused by process_file while the file is unchanged
+        self.combined_df = None
+        self.combined_stat = None
         self.main_layout.addWidget(self.file_label)
 
         # Options section with better organization
@@ -190,72 +195,69 @@ class ConsolidateUploader(QWidget):
         self.loading_overlay.setFixedSize(self.size())
 
     def upload_file(self, event):
-        self.file_path, _ = QFileDialog.getOpenFileName(self, "Select Excel File", "", "Excel Files (*.xlsx)")
-        if self.file_path:
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Excel File", "", "Excel Files (*.xlsx)")
+        if file_path:
+            self.file_path = file_path
+            self.combined_df = None
+            self.combined_stat = self._file_stat(file_path)
+
+            worker = Worker(read_action_sheets, file_path)
+            worker.signals.result.connect(self._on_upload_finished)
+            worker.signals.error.connect(self._on_upload_error)
+            worker.signals.cancelled.connect(self.loading_overlay.stop_loading)
+
             # Show loading overlay
-            self.loading_overlay.start_loading("Loading file...")
+            self.loading_overlay.start_loading("Loading file...", job=worker)
+            start_job(worker)
+
+    def _on_upload_finished(self, combined_df):
+        if combined_df.empty:
+            self.loading_overlay.stop_loading()
+            QMessageBox.warning(self, "Error", "No sheets found with an 'Action' column.")
+            return
             
-            try:
-                # Read all sheets from the Excel file
-                excel_file = pd.ExcelFile(self.file_path)
-                self.loading_overlay.set_progress(30)
-                
-                combined_df = pd.DataFrame()  # Initialize empty DataFrame
-                
-                # Iterate through all sheets
-                for sheet_name in excel_file.sheet_names:
-                    df = pd.read_excel(self.file_path, sheet_name=sheet_name)
-                    # Only include sheets that have an 'Action' column
-                    if 'Action' in df.columns:
-                        combined_df = pd.concat([combined_df, df], ignore_index=True)
-                
-                self.loading_overlay.set_progress(60)
-                
-                if combined_df.empty:
-                    self.loading_overlay.stop_loading()
-                    QMessageBox.warning(self, "Error", "No sheets found with an 'Action' column.")
-                    return
-                    
-                # Update file label
-                self.file_label.setText(f"{self.file_path.split('/')[-1]}")
-                
-                # Clear existing checkboxes
-                for checkbox in self.checkboxes.values():
-                    self.options_layout.removeWidget(checkbox)
-                    checkbox.deleteLater()
-                self.checkboxes.clear()
-
-                # Get unique options from the Action column
-                unique_options = combined_df['Action'].unique()
-                unique_options = [opt for opt in unique_options if pd.notna(opt) and opt != '']
-
-                if not unique_options:
-                    self.loading_overlay.stop_loading()
-                    QMessageBox.warning(self, "Error", "No valid options found in the Action column.")
-                    return
-
-                # Create new checkboxes for each unique option
-                for option in unique_options:
-                    checkbox = QCheckBox(str(option))
-                    self.checkboxes[str(option)] = checkbox
-                    self.options_layout.addWidget(checkbox)
-
-                self.loading_overlay.set_progress(80)
-
-                # Show the options section and process button
-                self.options_label.show()
-                self.options_container.show()
-                self.process_button.show()
-
-                # Load the combined table
-                self.load_table(self.file_table, combined_df)
-                
-                self.loading_overlay.set_progress(100)
-                self.loading_overlay.stop_loading()
-
-            except Exception as e:
-                self.loading_overlay.stop_loading()
-                QMessageBox.critical(self, "Error", f"Error loading file:\n{str(e)}")
+        self.combined_df = combined_df
+
+        # Update file label
+        self.file_label.setText(f"{self.file_path.split('/')[-1]}")
+        
+        # Clear existing checkboxes
+        for checkbox in self.checkboxes.values():
+            self.options_layout.removeWidget(checkbox)
+            checkbox.deleteLater()
+        self.checkboxes.clear()
+
+        # Get unique options from the Action column
+        unique_options = combined_df['Action'].dropna().unique()
+        unique_options = [opt for opt in unique_options if opt != '']
+
+        if not unique_options:
+            self.loading_overlay.stop_loading()
+            QMessageBox.warning(self, "Error", "No valid options found in the Action column.")
+            return
+
+        # Create new checkboxes for each unique option
+        for option in unique_options:
+            checkbox = QCheckBox(str(option))
+            self.checkboxes[str(option)] = checkbox
+            self.options_layout.addWidget(checkbox)
+
+        self.loading_overlay.set_progress(80)
+
+        # Show the options section and process button
+        self.options_label.show()
+        self.options_container.show()
+        self.process_button.show()
+
+        # Load the combined table
+        self.load_table(self.file_table, combined_df)
+        
+        self.loading_overlay.set_progress(100)
+        self.loading_overlay.stop_loading()
+
+    def _on_upload_error(self, message):
+        self.loading_overlay.stop_loading()
+        QMessageBox.critical(self, "Error", f"Error loading file:\n{message}")
 
     def process_file(self):
         if not self.file_path:
@@ -269,67 +271,58 @@ class ConsolidateUploader(QWidget):
             QMessageBox.warning(self, "Error", "Please select at least one option to remove.")
             return
 
+        # Get save location from user before processing starts
+        save_path, _ = QFileDialog.getSaveFileName(self, "Save Consolidated File", "", "Excel Files (*.xlsx)")
+        if not save_path:
+            QMessageBox.information(self, "Canceled", "Save operation was canceled.")
+            return
+        if not save_path.endswith(".xlsx"):
+            save_path += ".xlsx"
+
         # Disable process button
         self.process_button.setEnabled(False)
-        
+
+        # Reuse the sheets read on upload unless the file was saved since
+        combined_df = self.combined_df if self._file_stat(self.file_path) == self.combined_stat else None
+        worker = Worker(remove_action_rows, self.file_path, options_to_remove, save_path,
+                        combined_df=combined_df)
+        worker.signals.result.connect(self._on_process_finished)
+        worker.signals.error.connect(self._on_process_error)
+        worker.signals.cancelled.connect(self._on_process_cancelled)
+        # Re-enable process button
+        worker.signals.finished.connect(lambda: self.process_button.setEnabled(True))
+
         # Show loading overlay
-        self.loading_overlay.start_loading("Processing file...")
+        self.loading_overlay.start_loading("Processing file...", job=worker)
+        start_job(worker)
 
-        try:
-            # Read all sheets and combine those with Action column
-            excel_file = pd.ExcelFile(self.file_path)
-            combined_df = pd.DataFrame()
-            self.loading_overlay.set_progress(30)
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(self.file_path, sheet_name=sheet_name)
-                if 'Action' in df.columns:
-                    combined_df = pd.concat([combined_df, df], ignore_index=True)
-            
-            # Remove rows where Action is in selected options
-            df_filtered = combined_df[~combined_df['Action'].isin(options_to_remove)]
-            self.loading_overlay.set_progress(60)
-            
-            # Get save location from user
-            save_path, _ = QFileDialog.getSaveFileName(self, "Save Consolidated File", "", "Excel Files (*.xlsx)")
-            if save_path:
-                if not save_path.endswith(".xlsx"):
-                    save_path += ".xlsx"
-                    
-                # Save the filtered DataFrame to a single sheet
-                df_filtered.to_excel(save_path, index=False)
-                self.loading_overlay.set_progress(90)
-                
-                # Update the table view with filtered data
-                self.load_table(self.file_table, df_filtered)
-                
-                self.loading_overlay.stop_loading()
-                QMessageBox.information(self, "Success", f"File saved successfully to:\n{save_path}")
-            else:
-                self.loading_overlay.stop_loading()
-                QMessageBox.information(self, "Canceled", "Save operation was canceled.")
-            
-        except Exception as e:
-            self.loading_overlay.stop_loading()
-            QMessageBox.critical(self, "Error", f"Error processing file:\n{str(e)}")
+    def _on_process_finished(self, result):
+        save_path, df_filtered = result
+
+        # Update the table view with filtered data
+        self.load_table(self.file_table, df_filtered)
         
-        finally:
-            # Re-enable process button
-            self.process_button.setEnabled(True)
+        self.loading_overlay.stop_loading()
+        QMessageBox.information(self, "Success", f"File saved successfully to:\n{save_path}")
 
-    def load_table(self, table_view, df):
-        try:
-            model = QStandardItemModel()
+    def _on_process_error(self, message):
+        self.loading_overlay.stop_loading()
+        QMessageBox.critical(self, "Error", f"Error processing file:\n{message}")
 
-            # Set headers
-            model.setHorizontalHeaderLabels(df.columns.tolist())
+    def _on_process_cancelled(self):
+        self.loading_overlay.stop_loading()
+        QMessageBox.information(self, "Canceled", "Processing was canceled.")
 
-            # Populate data
-            for row in df.itertuples(index=False):
-                items = [QStandardItem(str(value)) for value in row]
-                model.appendRow(items)
+    def _file_stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
-            table_view.setModel(model)
+    def load_table(self, table_view, df):
+        try:
+            table_view.setModel(DataFrameModel(df))
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error loading table:\n{str(e)}")
@@ -0,0 +1,57 @@
+import logging
+import pandas as pd
+from excel_reader import EXCEL_ENGINE, sheet_headers
+from workbook_cache import read_sheets_cached
+
+log = logging.getLogger(__name__)
+
+
+def read_action_sheets(file_path, job):
+    """Background job: combine every sheet of the workbook that has an 'Action' column."""
+    job.progress.plan([("Reading sheets", 1)])
+    combined_df = _combine_action_sheets(file_path, job.progress)
+    job.progress.finish()
+    return combined_df
+
+
+def _combine_action_sheets(file_path, progress):
+    """Every sheet of the workbook that has an 'Action' column, concatenated in sheet order."""
+    # Only sheets whose header row has an Action column are parsed at all
+    try:
+        headers = sheet_headers(file_path)
+    except Exception as e:
+        log.warning("Could not read the sheet headers of %s, reading every sheet: %s", file_path, e)
+        headers = None
+    if headers:
+        sheet_names = [name for name, header in headers.items() if 'Action' in header]
+    else:
+        sheet_names = pd.ExcelFile(file_path, engine=EXCEL_ENGINE).sheet_names
+
+    progress.stage("Reading sheets", total=len(sheet_names), unit="sheets")
+    frames = [df for df in read_sheets_cached(file_path, sheet_names, progress) if 'Action' in df.columns]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def remove_action_rows(file_path, options_to_remove, save_path, job, combined_df=None):
+    """
+    Background job: drop rows whose Action is one of options_to_remove and
+    save the rest. combined_df is the result of read_action_sheets for
+    file_path when the caller still has it; otherwise the file is read again.
+    """
+    progress = job.progress
+    if combined_df is None:
+        progress.plan([("Reading sheets", 60), ("Removing rows", 5), ("Writing consolidated file", 35)])
+        # Read all sheets and combine those with Action column
+        combined_df = _combine_action_sheets(file_path, progress)
+    else:
+        progress.plan([("Removing rows", 5), ("Writing consolidated file", 35)])
+    
+    # Remove rows where Action is in selected options
+    progress.stage("Removing rows", total=len(combined_df))
+    df_filtered = combined_df[~combined_df['Action'].isin(options_to_remove)]
+    
+    # Save the filtered DataFrame to a single sheet
+    progress.stage("Writing consolidated file", total=len(df_filtered))
+    df_filtered.to_excel(save_path, index=False)
+    progress.finish()
+    return save_path, df_filtered
@@ -0,0 +1,200 @@
+"""
+Recognise settlement reports by their contents rather than their names.
+
+Every app mapping in config.json names the columns its reports carry. A
+report's header (and the types of a few sampled rows, see
+excel_reader.sniff_sheet) is scored against each mapping:
+
+    score = mean over the mapping's columns of
+            1    column present and its values look as expected
+            0.5  column present but e.g. text where an amount is expected
+            0    column missing
+
+An app named in the file name wins if its columns fit (score at least
+MIN_SCORE), so apps with identical mappings are still told apart by their
+names. Otherwise the best scoring app wins; a file the headers do not fit
+at all falls back to its name as before. The same scores drive
+propose_mapping, which fills in the Settings dropdowns for a new app's
+report.
+"""
+import logging
+import os
+import re
+from collections import namedtuple
+from excel_reader import STRING, FLOAT, DATETIME, sniff_sheet
+from settlement_pipeline import settlement_columns
+
+log = logging.getLogger(__name__)
+
+# Roles of an app mapping that name columns of the settlement report; the
+# match_col is a column of the AFC-triffi file instead
+MAPPING_ROLES = ['id_col', 'amount_col', 'settle_col', 'date_col', 'comment_col']
+
+# Type hint a role's values should have; ids may be text or numbers
+ROLE_KINDS = {'amount_col': FLOAT, 'settle_col': FLOAT, 'date_col': DATETIME, 'comment_col': STRING}
+
+# Words that give a column away for a role when no app uses its name yet,
+# strongest first
+ROLE_KEYWORDS = {
+    'id_col': ['ticket id', 'order id', 'reference', 'transaction id', 'txn id', 'id'],
+    'amount_col': ['total amount', 'total price', 'amount', 'price', 'fare'],
+    'settle_col': ['settlement amount', 'settled amount', 'payable', 'net amount', 'payout', 'settle'],
+    'date_col': ['settlement date', 'date', 'time'],
+    'comment_col': ['ticket status', 'payment status', 'status', 'remark', 'comment'],
+}
+
+# Below this score a report's headers are not taken to identify an app
+MIN_SCORE = 0.75
+
+# How one report was matched to an app.
+# - app: None when no app could be chosen
+# - score: header score of that app, 0 when only the file name matched
+# - reason: short explanation shown to the user
+FileMatch = namedtuple("FileMatch", ["path", "app", "score", "reason"])
+
+
+def score_app(columns, app_name, mapping):
+    """How well a report's SheetColumns fit one app mapping, from 0 to 1."""
+    by_name = {column.name: column for column in columns}
+    names, _ = settlement_columns(app_name, mapping)
+    roles = dict(zip(MAPPING_ROLES, names))
+    total = 0.0
+    for role, name in roles.items():
+        column = by_name.get(name)
+        if column is None:
+            continue
+        expected = ROLE_KINDS.get(role)
+        total += 0.5 if expected and column.kind and not _kind_fits(column.kind, expected) else 1.0
+    return total / len(roles)
+
+
+def identify_app(columns, config, file_name=""):
+    """The FileMatch for a report's SheetColumns; path is left empty."""
+    scores = {app_name: score_app(columns, app_name, mapping) for app_name, mapping in config.items()}
+    named = [app_name for app_name in config if app_name.lower() in file_name.lower()]
+
+    # The file name decides among the apps whose columns fit; of several
+    # named ones (one name inside another) the best fit, then the longest name
+    named_fits = [app_name for app_name in named if scores[app_name] >= MIN_SCORE]
+    if named_fits:
+        app_name = max(named_fits, key=lambda app_name: (scores[app_name], len(app_name)))
+        return FileMatch("", app_name, scores[app_name], "columns and file name")
+
+    best = max(scores.values(), default=0)
+    if best >= MIN_SCORE:
+        leaders = [app_name for app_name, score in scores.items() if score == best]
+        if len(leaders) == 1:
+            app_name = leaders[0]
+            if named:
+                log.warning("%s is named like %s but its columns are %s's", file_name, named[0], app_name)
+            return FileMatch("", app_name, best, "columns")
+        return FileMatch("", None, best, f"columns fit {', '.join(leaders)} equally; "
+                                          "put the app name in the file name")
+
+    if len(named) == 1:
+        return FileMatch("", named[0], scores[named[0]], "file name only, columns do not match")
+    return FileMatch("", None, best, "no app's columns match")
+
+
+def classify_files(paths, config, progress=None):
+    """FileMatch for every report; progress.advance() per file read."""
+    matches = []
+    for path in paths:
+        try:
+            columns = sniff_sheet(path)
+        except Exception as e:
+            log.warning("Could not read the header of %s: %s", path, e)
+            columns = []
+        match = identify_app(columns, config, os.path.basename(path))._replace(path=path)
+        if match.app is not None:
+            log.info("%s -> %s (%s, score %.2f)", os.path.basename(path), match.app, match.reason, match.score)
+        matches.append(match)
+        if progress is not None:
+            progress.advance()
+    return matches
+
+
+def assign_files(matches):
+    """
+    Settlement files by app from classify_files' matches, and a message for
+    every file that could not be used: unmatched, or a second file for an
+    app. Of two files for one app the better matching one is kept.
+    """
+    files = {}
+    problems = []
+    for match in sorted(matches, key=lambda match: -match.score):
+        name = os.path.basename(match.path)
+        if match.app is None:
+            problems.append(f"{name}: {match.reason}")
+        elif match.app in files:
+            problems.append(f"{name}: a second file for {match.app} after {os.path.basename(files[match.app])}")
+        else:
+            files[match.app] = match.path
+    return files, problems
+
+
+def identify_settlement_files(paths, config, job):
+    """Background job: classify_files and assign_files for a batch of reports."""
+    progress = job.progress
+    progress.plan([("Reading headers", 1)])
+    progress.stage("Reading headers", total=len(paths), unit="files")
+    result = assign_files(classify_files(paths, config, progress))
+    progress.finish()
+    return result
+
+
+def propose_mapping(columns, config):
+    """
+    Proposed {role: column name} for a new app's report, plus match_col when
+    an existing app's reports look the same. An existing mapping that fits
+    the report completely is proposed as it is; otherwise each role gets the
+    best scoring column not taken by another role, judged by the names other
+    apps use, ROLE_KEYWORDS and the sampled value types. Roles without a
+    convincing column are left out.
+    """
+    scores = {app_name: score_app(columns, app_name, mapping) for app_name, mapping in config.items()}
+    if scores and max(scores.values()) == 1.0:
+        app_name = max(scores, key=scores.get)
+        return {role: config[app_name][role] for role in MAPPING_ROLES + ['match_col'] if role in config[app_name]}
+
+    known_names = {role: {_normalize(mapping[role]) for mapping in config.values() if mapping.get(role)}
+                   for role in MAPPING_ROLES}
+    candidates = []
+    for role in MAPPING_ROLES:
+        for column in columns:
+            score = _role_score(role, column, known_names[role])
+            if score > 0:
+                candidates.append((score, role, column.name))
+
+    proposal = {}
+    taken = set()
+    for score, role, name in sorted(candidates, key=lambda candidate: -candidate[0]):
+        if role not in proposal and name not in taken:
+            proposal[role] = name
+            taken.add(name)
+    return proposal
+
+
+def _role_score(role, column, known_names):
+    name = _normalize(column.name)
+    if name in known_names:
+        score = 3.0
+    else:
+        keywords = ROLE_KEYWORDS[role]
+        hits = [i for i, keyword in enumerate(keywords) if keyword.replace(" ", "") in name.replace(" ", "")]
+        if not hits:
+            return 0.0
+        score = 2.0 - hits[0] / len(keywords)
+    expected = ROLE_KINDS.get(role)
+    if expected and column.kind:
+        score += 1.0 if _kind_fits(column.kind, expected) else -1.5
+    return score
+
+
+def _kind_fits(kind, expected):
+    # Statuses and remarks may well be numeric codes
+    return kind == expected or expected == STRING
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
@@ -1,16 +1,20 @@
 import json
-import pandas as pd
 from PyQt5.QtWidgets import (
     QWidget, QInputDialog, QVBoxLayout, QLabel, QPushButton, QFileDialog, QMessageBox, QTabWidget, QComboBox
 )
+from PyQt5.QtCore import Qt
 import os
 from loading_overlay import LoadingOverlay
 
+# Sampled rows shown in the column tooltips
+SAMPLE_ROWS = 20
+
 class SettingsTab(QWidget):
     def __init__(self, config_file_path):
         super().__init__()
         self.config_file_path = config_file_path
         self.columns = []  # Store extracted column names
+        self.sheet_columns = []  # SheetColumn (name, type hint, samples) of each column
         self.config_data = self.load_config()
         
         # Initialize dropdown variables
@@ -176,35 +180,55 @@ class SettingsTab(QWidget):
             self.loading_overlay.start_loading("Loading file...")
             
             try:
-                # Load the Excel file
-                df = pd.read_excel(file_path)
+                # The readers bring in pandas, so they are imported once there is a file to read
+                from excel_reader import sniff_sheet
+                from schema_detect import propose_mapping
+
+                # Only the header and a few rows are needed for the mapping
+                self.sheet_columns = sniff_sheet(file_path, sample_rows=SAMPLE_ROWS)
                 self.loading_overlay.set_progress(50)
                 
-                self.columns = df.columns.tolist()
+                self.columns = [column.name for column in self.sheet_columns]
 
-                # Populate dropdowns with column names
+                # Populate dropdowns with column names, with type and samples as tooltips
                 for dropdown in [self.id_col_dropdown,
                                  self.amount_col_dropdown, self.settle_col_dropdown,
                                  self.date_col_dropdown, self.comment_col_dropdown]:
                     dropdown.clear()
                     dropdown.addItems(self.columns)
+                    for i, column in enumerate(self.sheet_columns):
+                        dropdown.setItemData(i, self._column_tooltip(column), Qt.ToolTipRole)
                 
                 # Set predefined values for match_col_dropdown
                 self.match_col_dropdown.clear()
                 self.match_col_dropdown.addItems(['TicketNUmber', 'order_id', 'transaction_ref_no'])
 
+                # Preselect the columns that look like each role
+                proposal = propose_mapping(self.sheet_columns, self.config_data)
+                for role, dropdown in [('id_col', self.id_col_dropdown), ('match_col', self.match_col_dropdown),
+                                       ('amount_col', self.amount_col_dropdown),
+                                       ('settle_col', self.settle_col_dropdown),
+                                       ('date_col', self.date_col_dropdown),
+                                       ('comment_col', self.comment_col_dropdown)]:
+                    if role in proposal:
+                        dropdown.setCurrentText(proposal[role])
+
                 self.loading_overlay.set_progress(80)
 
                 # Enable the save button
                 self.save_button.setEnabled(True)
 
                 self.loading_overlay.stop_loading()
-                QMessageBox.information(self, "Success", "File uploaded successfully. Select columns.")
+                QMessageBox.information(self, "Success", "File uploaded successfully. Check the proposed columns.")
                 
             except Exception as e:
                 self.loading_overlay.stop_loading()
                 QMessageBox.critical(self, "Error", f"Error loading file: {e}")
 
+    def _column_tooltip(self, column):
+        samples = ", ".join(str(value) for value in column.samples[:5])
+        return f"Type: {column.kind or 'empty'}\nSamples: {samples or '-'}"
+
     def add_app_to_config(self):
         app_name, ok = QInputDialog.getText(self, "App Name", "Enter the name of the app:")
         if not ok or not app_name.strip():
@@ -0,0 +1,707 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from contextlib import nullcontext
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from app_config import config_file_path, load_config, save_date_formats
+from date_formats import parse_days, format_days
+from xlsx_export import SheetSpec, write_workbook
+from workbook_cache import read_excel_cached
+from excel_reader import STRING, FLOAT, CATEGORY
+from categories import as_category, with_categories, map_values, constant_category
+from progress import ProgressReporter
+from key_index import KeyIndex, duplicated_codes, outer_join
+from sidecar_cache import sidecar_cache
+from tracing import configure_logging, span, debug_enabled
+from reconciliation_store import ReconciliationStore
+from results_archive import ResultsArchive, ARCHIVE_STAGE
+
+log = logging.getLogger(__name__)
+
+# Worker processes that read and normalise the settlement files, one app
+# each; 0 or 1 does all apps in this process. Starting a worker costs a
+# second or two (it imports pandas), so it only pays off for large files.
+SETTLEMENT_WORKERS = int(os.getenv("KOCHIMETRO_SETTLEMENT_WORKERS", "0"))
+
+
+# Last Process result together with the signature of the inputs it was
+# computed from; reused by every output until one of the inputs changes
+_process_memo = {}
+_process_memo_lock = threading.Lock()
+
+
+def _input_signature(file_path, settlement_files, config=None, incremental=False):
+    """
+    Identify a Process run by the (path, mtime, size) of every input,
+    including config.json, or by the contents of an explicitly passed config,
+    and by whether it ran incrementally.
+    """
+    def file_key(path):
+        stat = os.stat(path)
+        return (os.path.normcase(os.path.abspath(path)), stat.st_mtime_ns, stat.st_size)
+
+    if config is not None:
+        config_key = json.dumps(config, sort_keys=True)
+    else:
+        config_path = config_file_path()
+        config_key = file_key(config_path) if os.path.exists(config_path) else None
+
+    settlement_keys = tuple(sorted(
+        (app_name.lower(), file_key(path)) for app_name, path in settlement_files.items()
+    ))
+    return (file_key(file_path), settlement_keys, config_key, incremental)
+
+
+def _archive_process(process, file_path, settlement_files, progress):
+    progress.stage(ARCHIVE_STAGE[0], total=len(process.sheet4))
+    with ResultsArchive() as results:
+        run_id = results.begin_run('settlement', [file_path] + list(settlement_files.values()))
+        results.add_rows(run_id, 'settlement', process.sheet4)
+        results.commit()
+    process.archived = True
+    progress.update(len(process.sheet4))
+
+
+def detect_app_name(file_name, app_names):
+    """Return the app whose name appears in file_name; raises if none does."""
+    for keyword in app_names:
+        if keyword.lower() in file_name.lower():
+            return keyword
+    raise Exception("Unrecognized file detected", file_name)
+
+
+def run_process(file_path, settlement_files, progress, output_stages, config=None, workers=None,
+                incremental=False, archive=False):
+    """
+    Return the Process for these inputs, computing it only if the inputs
+    changed since the last run. output_stages are the caller's own stages,
+    appended to the progress plan. config defaults to config.json, workers
+    to SETTLEMENT_WORKERS. incremental reuses and updates the results of
+    earlier runs kept in the ReconciliationStore; archive stores the merged
+    rows in the ResultsArchive, once per Process.
+    """
+    signature = _input_signature(file_path, settlement_files, config, incremental)
+    with _process_memo_lock:
+        process = _process_memo.get(signature)
+
+    if process is not None:
+        log.info("Reusing settlement results for %s", os.path.basename(file_path))
+        archive_stages = [ARCHIVE_STAGE] if archive and not process.archived else []
+        progress.plan(archive_stages + output_stages)
+        if archive_stages:
+            _archive_process(process, file_path, settlement_files, progress)
+        return process
+
+    archive_stages = [ARCHIVE_STAGE] if archive else []
+    with span(log, "settlement", apps=len(settlement_files)) as trace:
+        progress.plan([("Reading AFC-triffi file", 20)] + Process.STAGES + archive_stages + output_stages)
+        progress.stage("Reading AFC-triffi file")
+        original_df = read_excel_cached(
+            file_path, columns=Process.ORIGINAL_COLUMNS, dtypes=Process.ORIGINAL_DTYPES
+        )
+        progress.update(len(original_df), len(original_df))
+        trace.set(original_rows=len(original_df))
+
+        with ReconciliationStore() if incremental else nullcontext() as store:
+            process = Process(original_df, settlement_files, progress=progress, config=config,
+                              workers=workers, store=store)
+        trace.set(merged_rows=len(process.merged_data))
+
+        # Writing the formats touches config.json: key the memo on it as written
+        if config is None and process.date_formats:
+            save_date_formats(process.date_formats)
+            signature = _input_signature(file_path, settlement_files, config, incremental)
+
+        if archive:
+            _archive_process(process, file_path, settlement_files, progress)
+
+    with _process_memo_lock:
+        _process_memo.clear()
+        _process_memo[signature] = process
+    return process
+
+
+def build_summary(file_path, settlement_files, save_path, job, config=None, workers=None, incremental=False,
+                  archive=False):
+    """Background job: run Process and write the "Grouped Data" summary."""
+    progress = job.progress
+    process = run_process(file_path, settlement_files, progress, [("Writing summary", 5)], config, workers,
+                          incremental, archive)
+
+    sheets = _summary_sheets(process)
+    progress.stage("Writing summary", total=sum(len(sheet.df) for sheet in sheets))
+    write_workbook(save_path, sheets, progress=progress)
+
+    progress.finish()
+    return save_path
+
+
+def build_merged_doc(file_path, settlement_files, save_path, job, config=None, workers=None, incremental=False,
+                     archive=False):
+    """Background job: run Process and write the merged, per-app and duplicate sheets."""
+    progress = job.progress
+    process = run_process(file_path, settlement_files, progress, [("Writing merged sheets", 30)], config, workers,
+                          incremental, archive)
+
+    if not process.sheet4.empty:
+        sheets = _merged_sheets(process)
+    else:
+        sheets = [SheetSpec("No Data", pd.DataFrame())]
+
+    progress.stage("Writing merged sheets", total=sum(len(sheet.df) for sheet in sheets))
+    write_workbook(save_path, sheets, progress=progress)
+
+    progress.finish()
+    return save_path
+
+
+def build_all_outputs(file_path, settlement_files, save_path, job, config=None, workers=None, incremental=False,
+                      archive=False):
+    """
+    Background job: run Process once and write the "Grouped Data" summary and
+    the merged, per-app and duplicate sheets into a single workbook.
+    """
+    progress = job.progress
+    process = run_process(file_path, settlement_files, progress, [("Writing all sheets", 35)], config, workers,
+                          incremental, archive)
+
+    sheets = _summary_sheets(process)
+    if not process.sheet4.empty:
+        sheets += _merged_sheets(process)
+
+    progress.stage("Writing all sheets", total=sum(len(sheet.df) for sheet in sheets))
+    write_workbook(save_path, sheets, progress=progress)
+
+    progress.finish()
+    return save_path
+
+
+# Choices offered in the Action dropdown of the "Merged Data" sheet
+MERGED_ACTION_OPTIONS = ["Option1", "Option2", "Option3"]
+
+
+def _summary_sheets(process):
+    if not process.sheet1.empty:
+        summary = process.sheet1.assign(insertDT=format_days(process.sheet1['insertDT']))
+        return [SheetSpec("Grouped Data", summary)]
+    return [SheetSpec("No Data", pd.DataFrame())]
+
+
+def _merged_sheets(process):
+    # Work on a copy so the memoized Process is left untouched
+    merged = process.sheet4.copy()
+    merged['insertDT'] = format_days(merged['insertDT'])
+
+    # Add Action column efficiently using numpy
+    merged['Action'] = constant_category('', len(merged))
+    
+    # Ensure comment_col is preserved
+    merged['comment_col'] = with_categories(merged['comment_col'], 'No comment').fillna('No comment')
+    
+    # Main sheet, with the Action dropdown
+    sheets = [SheetSpec("Merged Data", merged, action_options=MERGED_ACTION_OPTIONS)]
+
+    # Find duplicates based on ticket numbers and include all occurrences,
+    # ordered by ticket number
+    ticket_codes = process.ticket_index.codes(0)
+    rows = np.flatnonzero(duplicated_codes(ticket_codes, len(process.ticket_index)))
+    duplicates = merged.iloc[rows[np.argsort(ticket_codes[rows], kind='stable')]]
+    # Filter out rows with empty or missing ticket numbers
+    duplicates = duplicates[duplicates['TicketNUmber'].notna() & (duplicates['TicketNUmber'] != 'MISSING')]
+    if not duplicates.empty:
+        sheets.append(SheetSpec("Duplicate Tickets", duplicates))
+
+    # Create separate sheets for each ONDCapp
+    for app in merged['ONDCapp'].unique():
+        if pd.notna(app):  # Skip if app name is NaN
+            app_data = merged[merged['ONDCapp'] == app]
+            if not app_data.empty:
+                sheets.append(SheetSpec(f"{app} Data", app_data))
+    return sheets
+
+
+class Process:
+    """
+    Core processing logic for settlement reconciliation.
+    
+    Flow:
+    1. Loads and normalizes the main transaction data
+    2. Loads and processes settlement files from different payment apps
+    3. Merges settlement data with original transactions
+    4. Identifies discrepancies (excess/shortage/settled)
+    5. Generates summary reports
+
+    Progress is reported through the optional ProgressReporter using the
+    labels in STAGES, so callers can include them in their own plan. With a
+    ReconciliationStore, only what changed since the run the store remembers
+    is parsed and joined again.
+    """
+    STAGES = [
+        ("Reading settlement files", 40),
+        ("Normalising dates", 10),
+        ("Merging settlement data", 25),
+        ("Summarising transactions", 5),
+    ]
+
+    # Columns of the AFC-triffi file used by the pipeline, with their type hints
+    ORIGINAL_COLUMNS = [
+        'insertDT', 'TicketNUmber', 'order_id', 'transaction_ref_no', 'ONDCapp',
+        'total_amount', 'QRCodePrice', 'booking_status', 'descCode', 'Remark'
+    ]
+    ORIGINAL_DTYPES = {
+        'TicketNUmber': STRING, 'order_id': STRING, 'transaction_ref_no': STRING,
+        'total_amount': FLOAT, 'QRCodePrice': FLOAT, 'ONDCapp': CATEGORY,
+        'booking_status': CATEGORY, 'descCode': CATEGORY, 'Remark': CATEGORY
+    }
+
+    # Columns of sheet4 with few distinct values, kept as categoricals
+    CATEGORY_COLUMNS = ['ONDCapp', 'booking_status', 'descCode', 'Remark', 'comment_col', 'result']
+
+    # QUICK FIX: comment columns for apps whose config predates comment_col
+    FALLBACK_COMMENT_COLS = {
+        'easemytrip': 'TicketStatus',
+        'nammayathri': 'Ticket Status',
+        'phonepe': 'Ticket Status',
+        'paytm': 'Payment Status',
+        'rapido': 'Ticket Status',
+        'redbus': 'Ticket Status'
+    }
+
+    def __init__(self, original_df, settlement_files, progress=None, config=None, workers=None, store=None):
+        self.original_df = original_df  # Main transaction data
+        self.settlement_files = {}      # Settlement data from payment apps
+        self.progress = progress or ProgressReporter()
+        self.store = store
+        self.date_formats = {}          # Settlement date formats found that config.json lacks
+        if config is None:
+            self.load_config()         # Load app-specific column mappings
+        else:
+            self.app_mapping = config
+        workers = SETTLEMENT_WORKERS if workers is None else workers
+
+        if workers > 1 and len(settlement_files) > 1:
+            settlements = self._prepare_settlements_in_workers(settlement_files, workers)
+        else:
+            settlements = self._prepare_settlements(settlement_files)
+
+        # Merge and analyze data
+        self.merged_data = self._merge_settlement_data(settlements)
+        self.progress.stage("Summarising transactions", total=len(self.merged_data))
+        self.grouped_data = self._summarize_transactions()
+        self.progress.update(len(self.merged_data))
+        
+        # Prepare output sheets
+        self.sheet1 = self.grouped_data    # Summary by app and date
+        self.sheet4 = self.merged_data     # Detailed transaction matching
+
+        # Ticket codes of sheet4, shared by every output that looks for duplicates
+        self.ticket_index = KeyIndex(self.merged_data['TicketNUmber'])
+
+        # Set once run_process has stored sheet4 in the ResultsArchive
+        self.archived = False
+
+    def _prepare_settlements(self, settlement_files):
+        """
+        Read, date-normalise and normalise every app's settlement file in this
+        process. Returns {app: normalised records, or None if unusable}.
+        """
+        # Process each settlement file
+        self.progress.stage("Reading settlement files", total=len(settlement_files), unit="files")
+        for app_name, file_path in settlement_files.items():
+            app_name = app_name.lower()
+            if app_name in self.app_mapping:
+                self.settlement_files[app_name] = read_settlement(app_name, self.app_mapping[app_name], file_path)
+            self.progress.advance()
+        
+        # Standardize formats and process data
+        self.progress.stage("Normalising dates", total=len(self.settlement_files) + 1, unit="files")
+        self._normalize_original_df()
+        self.progress.advance()
+        self._process_settlement_files()
+
+        self.progress.stage("Merging settlement data", total=len(self.settlement_files), unit="apps")
+        settlements = {}
+        for app_name, mapping in self.app_mapping.items():
+            settlement_df = self.settlement_files.get(app_name)
+            if settlement_df is None:
+                continue
+            settlements[app_name] = _normalize_or_skip(
+                app_name, mapping, settlement_df, self.original_df.columns)
+            self.progress.advance()
+        return settlements
+
+    def _prepare_settlements_in_workers(self, settlement_files, workers):
+        """
+        Same as _prepare_settlements with every app's file handled start to
+        finish in a worker process, while this process normalises the
+        AFC-triffi dates. Only the normalised records come back, so the
+        frames pickled between processes are a few columns wide. The raw
+        settlement frames stay in the workers and settlement_files is empty.
+        """
+        apps = {}
+        for app_name, file_path in settlement_files.items():
+            if app_name.lower() in self.app_mapping:
+                apps[app_name.lower()] = file_path
+        original_columns = list(self.original_df.columns)
+
+        # spawn rather than fork: jobs run on a GUI worker thread, and
+        # Windows only has spawn anyway
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(apps)) or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_settlement_worker,
+            initargs=(logging.getLogger().getEffectiveLevel(), sidecar_cache.max_bytes),
+        )
+        try:
+            futures = {
+                executor.submit(prepare_settlement, app_name, self.app_mapping[app_name],
+                                file_path, original_columns): app_name
+                for app_name, file_path in apps.items()
+            }
+            # Files of unconfigured apps are skipped, as in _prepare_settlements
+            self.progress.stage("Reading settlement files", total=len(settlement_files), unit="files")
+            self.progress.update(len(settlement_files) - len(apps))
+
+            self.progress.stage("Normalising dates", total=1, unit="files")
+            self._normalize_original_df()
+            self.progress.advance()
+
+            self.progress.stage("Merging settlement data", total=len(apps), unit="apps")
+            prepared = {}
+            for future in as_completed(futures):
+                app_name = futures[future]
+                prepared[app_name], date_format = future.result()
+                self._found_date_format(app_name, date_format)
+                self.progress.advance()
+        finally:
+            # On failure or cancellation, drop the apps that have not started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return {app_name: prepared[app_name] for app_name in self.app_mapping if app_name in prepared}
+
+    def load_config(self):
+        self.app_mapping = load_config()
+
+    def _normalize_original_df(self):
+        self.original_df['ONDCapp'] = map_values(self.original_df['ONDCapp'],
+                                                 lambda app: app.lower() if isinstance(app, str) else np.nan)
+        # yathri is nammayathri's old name, in whichever column it appears;
+        # categoricals are renamed per category rather than per row
+        for column in self.original_df.columns:
+            values = self.original_df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                self.original_df[column] = map_values(values, lambda value: 'nammayathri' if value == 'yathri' else value)
+            else:
+                self.original_df[column] = values.replace('yathri', 'nammayathri')
+        self.original_df['insertDT'] = self._standardize_date(self.original_df['insertDT'])
+
+    def _process_settlement_files(self):
+        for app_name, df in self.settlement_files.items():
+            mapping = self.app_mapping[app_name]
+            try:
+                df, date_format = normalize_settlement_dates(
+                    app_name, mapping['date_col'], df, mapping.get('date_format'))
+                self.settlement_files[app_name] = df
+                self._found_date_format(app_name, date_format)
+            finally:
+                self.progress.advance()
+
+    def _found_date_format(self, app_name, date_format):
+        if date_format is not None and date_format != self.app_mapping[app_name].get('date_format'):
+            log.info("[%s] Settlement dates are %s", app_name, date_format)
+            self.date_formats[app_name] = date_format
+
+    def _merge_settlement_data(self, settlements):
+        """
+        Match every app's settlement records to the original transactions.
+
+        settlements maps each app with a settlement file to its normalized
+        records, or to None if the file could not be used, in which case the
+        app is left out together with its original rows. The records are
+        stacked into one frame and joined once on (ONDCapp, match key), where
+        the match key is the app's configured match_col; rows come out
+        grouped by app in config order and sorted by key within each app.
+        With a store, only the keys of changed partitions are joined and the
+        rows of the others come from the store.
+        """
+        # Create base DataFrame with required columns
+        merged_data = self.original_df[['insertDT', 'TicketNUmber', 'order_id', 
+                                      'transaction_ref_no', 'ONDCapp', 'total_amount', 
+                                      'QRCodePrice', 'booking_status', 'descCode', 'Remark']].copy()
+        
+        # Add empty settlement columns
+        merged_data['amount_col'] = None
+        merged_data['settle_col'] = None
+        merged_data['comment_col'] = None
+        merged_data['unsettled'] = None
+
+        # Store original row count
+        original_count = len(merged_data)
+
+        processed_apps = set(settlements)
+        match_cols = {app: self.app_mapping[app]['match_col']  # app -> column of the original data holding its key
+                      for app, records in settlements.items() if records is not None}
+        settlements = [records for records in settlements.values() if records is not None]
+
+        pieces = []  # matched rows, then the rows of apps without a settlement file
+        if settlements:
+            settlement_data = pd.concat(settlements, ignore_index=True)
+            app_data = merged_data[merged_data['ONDCapp'].isin(list(match_cols))].copy()
+
+            # Resolve each row's key from its app's match column
+            match_key = pd.Series(np.nan, index=app_data.index, dtype=object)
+            for match_col in set(match_cols.values()):
+                apps = [app for app, col in match_cols.items() if col == match_col]
+                match_key = match_key.mask(app_data['ONDCapp'].isin(apps), app_data[match_col])
+            app_data['match_key'] = match_key
+            app_data = app_data.drop(columns=['amount_col', 'settle_col', 'comment_col', 'unsettled'])
+            log.debug("Ready for merge: app_data=%d rows, settlement_data=%d rows", len(app_data), len(settlement_data))
+
+            if self.store is not None:
+                # The cached date format changes no day, so it does not count as a mapping change
+                mappings = {app: {role: column for role, column in self.app_mapping[app].items()
+                                  if role != 'date_format'}
+                            for app in match_cols}
+                merged = self.store.merge(app_data, settlement_data, mappings,
+                                          partial(_join_settlements, match_cols=match_cols))
+            else:
+                merged = _join_settlements(app_data, settlement_data, match_cols)
+            pieces.append(merged.drop(columns=['match_key', 'settlement_date']))
+
+        # Add unprocessed records from other apps
+        pieces.append(merged_data[~merged_data['ONDCapp'].isin(processed_apps)])
+        # Empty pieces are left out of the concat, which would warn about
+        # them; when all are empty, the first one keeps the columns
+        non_empty = [piece for piece in pieces if not piece.empty]
+        if non_empty:
+            final_merged_data = pd.concat(non_empty, ignore_index=True)
+        else:
+            final_merged_data = pieces[0].reset_index(drop=True)
+
+        if debug_enabled(log):
+            log.debug("Comment column values (%d missing):\n%s",
+                      final_merged_data['comment_col'].isna().sum(),
+                      final_merged_data['comment_col'].value_counts().head(10).to_string())
+
+        # Add result column based on conditions
+        conditions = [
+            # Settled: All amounts present
+            (final_merged_data['total_amount'].notna() & 
+             final_merged_data['QRCodePrice'].notna() & 
+             final_merged_data['settle_col'].notna() & 
+             final_merged_data['amount_col'].notna()),
+            
+            # Shortage: Settlement amounts missing
+            (final_merged_data['settle_col'].isna() & 
+             final_merged_data['amount_col'].isna()),
+            
+            # Excess: Original amounts missing 
+            (final_merged_data['total_amount'].isna() & 
+             final_merged_data['QRCodePrice'].isna())
+        ]
+
+        choices = ['Settled', 'Shortage', 'Excess']
+        final_merged_data['result'] = np.select(conditions, choices, default='Unknown')
+        for column in self.CATEGORY_COLUMNS:
+            final_merged_data[column] = as_category(final_merged_data[column])
+
+        # Log summary of data
+        final_count = len(final_merged_data)
+        log.info("Settlement merge: original_rows=%d final_rows=%d settlement_only_rows=%d",
+                 original_count, final_count, final_count - original_count)
+
+        # Make sure to include the result column in the returned data
+        columns = ['insertDT', 'TicketNUmber', 'order_id', 'transaction_ref_no', 'ONDCapp', 
+            'total_amount', 'QRCodePrice', 'booking_status', 'descCode', 'Remark', 
+            'amount_col', 'settle_col', 'unsettled', 'comment_col', 'result']
+        
+        # Filter columns that exist in the DataFrame to avoid KeyErrors
+        existing_columns = [col for col in columns if col in final_merged_data.columns]
+        return final_merged_data[existing_columns]
+
+    def _summarize_transactions(self):
+        grouped_data = self.merged_data.groupby(['ONDCapp', 'insertDT'], observed=True, dropna=False).agg({
+            'QRCodePrice': 'sum',
+            'total_amount': 'sum',
+            'amount_col': 'sum',
+            'settle_col': 'sum',
+            'comment_col': 'first'
+        }).reset_index()
+        grouped_data.rename(columns={
+            'QRCodePrice': 'original_amount(afc)',
+            'total_amount': 'original_amount(triffi)',
+            'amount_col': 'total_amount',
+            'settle_col': 'settlement_amount',
+            'comment_col': 'comment'
+        }, inplace=True)
+        return grouped_data
+
+    def _standardize_date(self, date_series):
+        """Reduce dates to days (datetime64 at midnight); on failure the series is returned as it is."""
+        try:
+            return parse_days(date_series)[0]
+        except Exception as e:
+            log.warning("Error standardizing dates: %s", e)
+            return date_series
+
+
+def _join_settlements(app_data, settlement_data, match_cols):
+    """
+    Outer join of the original rows of the apps in match_cols with their
+    settlement records on (ONDCapp, match_key), with the derived columns
+    filled in. match_cols maps each app to the column of the original data
+    holding its key, in config order.
+    """
+    # Keep outer join to get both unmatched original rows AND unmatched settlement rows.
+    # Keys are coded as (app rank, key code), so the result comes out
+    # grouped by app in config order and sorted by key within each app
+    key_index = KeyIndex(app_data['match_key'], settlement_data['match_key'])
+    app_order = {app: rank for rank, app in enumerate(match_cols)}
+    app_codes = [frame['ONDCapp'].map(app_order).to_numpy(dtype=np.int64) * len(key_index)
+                 for frame in (app_data, settlement_data)]
+    merged = outer_join(
+        app_data,
+        settlement_data,
+        app_codes[0] + key_index.codes(0),
+        app_codes[1] + key_index.codes(1),
+        on=['ONDCapp', 'match_key']
+    )
+    log.debug("After merge: %d rows", len(merged))
+
+    # Settlement-only records take their date and ID from the settlement file
+    merged['insertDT'] = merged['insertDT'].fillna(merged['settlement_date'])
+    for id_col in ['TicketNUmber', 'order_id', 'transaction_ref_no']:
+        rows = merged['ONDCapp'].isin([app for app, col in match_cols.items() if col == id_col])
+        merged[id_col] = merged[id_col].mask(rows & merged[id_col].isna(), merged['match_key'])
+
+    # Make sure all comment values are strings and replace NaN with 'No comment'
+    merged['comment_col'] = merged['comment_col'].fillna('No comment')
+    merged['comment_col'] = merged['comment_col'].astype(str)
+    merged['comment_col'] = merged['comment_col'].replace('nan', 'No comment')
+    merged['comment_col'] = merged['comment_col'].replace('None', 'No comment')
+
+    # Calculate unsettled amount (handle NaN values); redbus and rapido
+    # settle the full amount, the others the settlement amount
+    settled = merged['amount_col'].where(merged['ONDCapp'].isin(['redbus', 'rapido']), merged['settle_col'])
+    merged['unsettled'] = merged['QRCodePrice'].fillna(0) - settled.fillna(0)
+
+    return merged
+
+
+# Per-app settlement steps. They live at module level so that worker
+# processes can run them; Process runs the same steps in-process.
+
+def settlement_columns(app_name, mapping):
+    """Columns to read from an app's settlement file, with their type hints."""
+    comment_col = mapping.get('comment_col', Process.FALLBACK_COMMENT_COLS.get(app_name))
+    columns = [mapping['id_col'], mapping['amount_col'], mapping['settle_col'], mapping['date_col']]
+    if comment_col:
+        columns.append(comment_col)
+    dtypes = {mapping['id_col']: STRING, mapping['amount_col']: FLOAT, mapping['settle_col']: FLOAT}
+    return columns, dtypes
+
+
+def read_settlement(app_name, mapping, file_path):
+    columns, dtypes = settlement_columns(app_name, mapping)
+    return read_excel_cached(file_path, columns=columns, dtypes=dtypes)
+
+
+def normalize_settlement_dates(app_name, date_col, df, date_format=None):
+    """
+    Reduce the settlement dates to days, trying date_format first (see
+    date_formats.parse_days). Returns df and the format of its dates, which
+    is None if they were dates already or on failure, when df is returned
+    as it is.
+    """
+    try:
+        if debug_enabled(log):
+            log.debug("[%s] Column '%s' (%s) before normalization:\n%s",
+                      app_name, date_col, df[date_col].dtype, df[date_col].head().to_string())
+
+        df[date_col], date_format = parse_days(df[date_col], date_format)
+
+        if debug_enabled(log):
+            log.debug("[%s] Column '%s' after normalization:\n%s",
+                      app_name, date_col, df[date_col].head().to_string())
+        return df, date_format
+
+    except Exception as e:
+        log.warning("[%s] Error processing dates: %s", app_name, e)
+        if debug_enabled(log) and date_col in df.columns:
+            log.debug("[%s] Raw date values: %s", app_name, df[date_col].head().tolist())
+    return df, None
+
+
+def normalize_settlement(app_name, mapping, settlement_df, original_columns):
+    """One app's settlement records as ONDCapp, match_key, amount_col, settle_col, settlement_date and comment_col."""
+    if mapping['match_col'] not in original_columns:
+        raise KeyError(mapping['match_col'])
+
+    id_col = mapping['id_col']
+    comment_col = mapping.get('comment_col', Process.FALLBACK_COMMENT_COLS.get(app_name))
+    required_cols = [id_col, mapping['amount_col'], mapping['settle_col'], mapping['date_col']]
+    if comment_col:
+        required_cols.append(comment_col)
+
+    # Filter to only include columns that exist in the settlement_df
+    settlement_data = settlement_df[[col for col in required_cols if col in settlement_df.columns]]
+
+    # Handle duplicate id_col entries by aggregating amount and settlement columns
+    if settlement_data[id_col].duplicated().any():
+        log.info("[%s] Found duplicate IDs in settlement data - aggregating", app_name)
+        agg_dict = {
+            mapping['amount_col']: 'sum',
+            mapping['settle_col']: 'sum',
+            mapping['date_col']: 'first'
+        }
+        if comment_col:
+            agg_dict[comment_col] = 'first'
+        settlement_data = settlement_data.groupby(id_col).agg(agg_dict).reset_index()
+
+    match_key = settlement_data[id_col]
+    settle = settlement_data[mapping['settle_col']]
+    if app_name == 'nammayathri':
+        settle = settle.clip(lower=0)
+    if app_name == 'paytm':
+        match_key = match_key.astype(str).str.replace('...', '').str.strip()
+
+    return pd.DataFrame({
+        'ONDCapp': app_name,
+        'match_key': match_key,
+        'amount_col': settlement_data[mapping['amount_col']],
+        'settle_col': settle,
+        'settlement_date': settlement_data[mapping['date_col']],
+        'comment_col': settlement_data[comment_col] if comment_col in settlement_data.columns else np.nan,
+    })
+
+
+def prepare_settlement(app_name, mapping, file_path, original_columns):
+    """
+    Worker process job: read, date-normalise and normalise one app's
+    settlement file. Returns the records and the format of their dates.
+    """
+    settlement_df = read_settlement(app_name, mapping, file_path)
+    settlement_df, date_format = normalize_settlement_dates(
+        app_name, mapping['date_col'], settlement_df, mapping.get('date_format'))
+    return _normalize_or_skip(app_name, mapping, settlement_df, original_columns), date_format
+
+
+def _normalize_or_skip(app_name, mapping, settlement_df, original_columns):
+    """normalize_settlement, or None for an app whose file cannot be used."""
+    try:
+        return normalize_settlement(app_name, mapping, settlement_df, original_columns)
+    except Exception:
+        log.exception("[%s] Could not use the settlement file, its rows are left out", app_name)
+        return None
+
+
+def _init_settlement_worker(log_level, sidecar_max_bytes):
+    # Spawned workers start from a fresh interpreter: log like the parent
+    # and honour its sidecar budget (the benchmark turns sidecars off)
+    configure_logging(log_level)
+    sidecar_cache.max_bytes = sidecar_max_bytes
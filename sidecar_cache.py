@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from app_config import app_folder
+
+log = logging.getLogger(__name__)
+
+# Feather keeps a parsed sheet in Arrow's columnar layout and loads in
+# milliseconds; without pyarrow every column is stored as its own .npy file
+try:
+    import pyarrow  # noqa: F401
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+# Bump when the stored layout or the parsing rules change, so sidecars
+# written by an older version are ignored instead of loaded
+FORMAT_VERSION = 2
+
+_META_FILE = "meta.json"
+_FEATHER_FILE = "data.feather"
+_HASH_CHUNK = 1024 * 1024
+
+
+class SidecarCache:
+    """
+    On-disk columnar copies of parsed worksheets.
+    - Entries are keyed by the SHA-1 of the file contents plus the sheet,
+      column projection and type hints, so a renamed or copied workbook
+      still hits and an edited one never does
+    - Each entry is a directory holding meta.json and either data.feather
+      or one col_<n>.npy file per column (codes, plus col_<n>_categories.npy,
+      for a categorical)
+    - Once the entries exceed max_bytes on disk, the least recently loaded
+      ones are deleted
+    - A corrupt or unreadable entry is treated as a miss and removed
+    """
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._hashes = {}  # (path, mtime, size) -> content hash
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def load(self, path, key):
+        entry_dir = self._entry_dir(path, key)
+        if not os.path.isdir(entry_dir):
+            return None
+        try:
+            df = _read_entry(entry_dir)
+        except Exception as e:
+            log.warning("Discarding unreadable sidecar %s: %s", entry_dir, e)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # The directory mtime records the last use for pruning
+        os.utime(entry_dir)
+        return df
+
+    def save(self, path, key, df):
+        entry_dir = self._entry_dir(path, key)
+        if os.path.isdir(entry_dir):
+            return
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_dir)
+            _write_entry(tmp_dir, df)
+            os.rename(tmp_dir, entry_dir)
+        except Exception as e:
+            # Another thread or process may have written the same entry first
+            if not os.path.isdir(entry_dir):
+                log.warning("Could not write sidecar for %s: %s", path, e)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.prune()
+
+    def prune(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if ".tmp-" in name or not os.path.isdir(entry_dir):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+            entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entry_dir(self, path, key):
+        digest = hashlib.sha1(self._file_hash(path).encode())
+        digest.update(repr((FORMAT_VERSION,) + tuple(key)).encode())
+        return os.path.join(self.cache_dir, digest.hexdigest())
+
+    def _file_hash(self, path):
+        stat = os.stat(path)
+        stat_key = (os.path.normcase(os.path.abspath(path)), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            file_hash = self._hashes.get(stat_key)
+        if file_hash is None:
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                    digest.update(chunk)
+            file_hash = digest.hexdigest()
+            with self._lock:
+                self._hashes[stat_key] = file_hash
+        return file_hash
+
+
+def _write_entry(entry_dir, df):
+    names = list(df.columns)
+    if not all(type(name) in (str, int) for name in names):
+        raise ValueError("column names must be strings or integers")
+
+    meta = {"columns": names, "rows": len(df), "format": "npy", "categorical": []}
+    arrow_names = all(type(name) is str for name in names) and len(set(names)) == len(names)
+    if HAVE_ARROW and names and arrow_names:
+        try:
+            df.reset_index(drop=True).to_feather(os.path.join(entry_dir, _FEATHER_FILE))
+            meta["format"] = "feather"
+        except Exception:
+            # Columns mixing numbers and text have no Arrow type; store as .npy
+            pass
+
+    if meta["format"] == "npy":
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                np.save(os.path.join(entry_dir, f"col_{i}.npy"), column.cat.codes.to_numpy())
+                np.save(os.path.join(entry_dir, f"col_{i}_categories.npy"),
+                        column.cat.categories.to_numpy(), allow_pickle=True)
+                meta["categorical"].append(i)
+            else:
+                np.save(os.path.join(entry_dir, f"col_{i}.npy"), column.to_numpy(), allow_pickle=True)
+
+    with open(os.path.join(entry_dir, _META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def _read_entry(entry_dir):
+    with open(os.path.join(entry_dir, _META_FILE)) as f:
+        meta = json.load(f)
+
+    if meta["format"] == "feather":
+        df = pd.read_feather(os.path.join(entry_dir, _FEATHER_FILE))
+        # Arrow hands back None for empty text cells where the Excel readers
+        # give NaN; keep NaN so astype(str) and friends behave the same
+        for name in df.columns:
+            if df[name].dtype == object:
+                df[name] = df[name].where(df[name].notna(), np.nan)
+        return df
+
+    columns = [np.load(os.path.join(entry_dir, f"col_{i}.npy"), allow_pickle=True)
+               for i in range(len(meta["columns"]))]
+    for i in meta["categorical"]:
+        categories = np.load(os.path.join(entry_dir, f"col_{i}_categories.npy"), allow_pickle=True)
+        columns[i] = pd.Categorical.from_codes(columns[i], categories)
+    df = pd.DataFrame(dict(enumerate(columns)), index=pd.RangeIndex(meta["rows"]))
+    df.columns = meta["columns"]
+    return df
+
+
+# Disk budget for sidecars; set KOCHIMETRO_SIDECAR_MB=0 to turn them off
+SIDECAR_BUDGET_MB = int(os.getenv("KOCHIMETRO_SIDECAR_MB", "2048"))
+SIDECAR_DIR = os.getenv("KOCHIMETRO_SIDECAR_DIR") or os.path.join(app_folder(), "sidecar")
+
+sidecar_cache = SidecarCache(SIDECAR_DIR, SIDECAR_BUDGET_MB * 1024 * 1024)
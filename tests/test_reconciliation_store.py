@@ -0,0 +1,48 @@
+from functools import partial
+import pandas as pd
+from reconciliation_store import ReconciliationStore
+from settlement_pipeline import _join_settlements
+
+MATCH_COLS = {'phonepe': 'TicketNUmber'}
+MAPPINGS = {'phonepe': {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT',
+                        'settle_col': 'Settlement Amount', 'date_col': 'Date'}}
+
+
+def app_rows(*tickets):
+    return pd.DataFrame({
+        'ONDCapp': ['phonepe'] * len(tickets),
+        'TicketNUmber': list(tickets), 'order_id': None, 'transaction_ref_no': None,
+        'QRCodePrice': [10.0] * len(tickets),
+        'insertDT': pd.to_datetime(['2024-01-05'] * len(tickets)),
+        'match_key': list(tickets),
+    })
+
+
+def settlement_rows(*tickets):
+    return pd.DataFrame({
+        'ONDCapp': ['phonepe'] * len(tickets),
+        'match_key': list(tickets),
+        'amount_col': [10.0] * len(tickets), 'settle_col': [9.5] * len(tickets),
+        'comment_col': ['SUCCESS'] * len(tickets),
+        'settlement_date': pd.to_datetime(['2024-01-05'] * len(tickets)),
+    })
+
+
+def merge(store, app_data, settlement_data):
+    return store.merge(app_data, settlement_data, MAPPINGS, partial(_join_settlements, match_cols=MATCH_COLS))
+
+
+def test_first_run_without_rows_gives_an_empty_join(tmp_path):
+    with ReconciliationStore(str(tmp_path / "state.sqlite")) as store:
+        merged = merge(store, app_rows(), settlement_rows())
+    expected = _join_settlements(app_rows(), settlement_rows(), MATCH_COLS)
+    assert merged.empty
+    assert list(merged.columns) == list(expected.columns)
+
+
+def test_rows_after_an_empty_first_run_are_joined(tmp_path):
+    with ReconciliationStore(str(tmp_path / "state.sqlite")) as store:
+        merge(store, app_rows(), settlement_rows())
+        merged = merge(store, app_rows('T1', 'T2'), settlement_rows('T1'))
+    assert sorted(merged['match_key']) == ['T1', 'T2']
+    assert merged.loc[merged['match_key'] == 'T1', 'settle_col'].tolist() == [9.5]
@@ -0,0 +1,58 @@
+import pandas as pd
+import results_archive
+from results_archive import ResultsArchive, search_archive
+
+
+def compare_rows(count, prefix="C"):
+    return pd.DataFrame({
+        'TicketNUmber': [f"{prefix}{i}" for i in range(count)],
+        'insertDT': pd.to_datetime(['2024-01-05'] * count),
+        'ONDCapp': 'phonepe',
+    })
+
+
+def settlement_rows(days):
+    return pd.DataFrame({
+        'insertDT': pd.to_datetime([f"2024-01-{day:02d}" for day in days]),
+        'TicketNUmber': [f"S{day}" for day in days],
+        'ONDCapp': 'phonepe',
+    })
+
+
+def archive(path, kind, df, sheet=None):
+    with ResultsArchive(path) as results:
+        run_id = results.begin_run(kind, [])
+        results.add_rows(run_id, kind, df, sheet=sheet)
+        results.commit()
+
+
+def test_search_is_capped_by_all_kinds_together(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite")
+    monkeypatch.setattr(results_archive, 'ARCHIVE_FILE', path)
+    monkeypatch.setattr(results_archive, 'QUERY_LIMIT', 10)
+    archive(path, 'compare', compare_rows(6), sheet='Errors')
+    archive(path, 'settlement', settlement_rows(range(1, 7)))
+
+    # 12 rows match, more than the 10 shown
+    rows, _, capped = search_archive("", "phonepe", None, None, job=None)
+    assert len(rows) == 10 and capped
+
+    # 6 of each kind fit in 20: nothing left out
+    monkeypatch.setattr(results_archive, 'QUERY_LIMIT', 20)
+    rows, _, capped = search_archive("", "phonepe", None, None, job=None)
+    assert len(rows) == 12 and not capped
+
+
+def test_rows_without_a_key_are_replaced_too(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    rows = compare_rows(2)
+    rows.loc[1, 'TicketNUmber'] = None
+    days = settlement_rows([5, 6])
+    days.loc[1, 'insertDT'] = pd.NaT
+    for _ in range(3):
+        archive(path, 'compare', rows, sheet='Errors')
+        archive(path, 'settlement', days)
+
+    with ResultsArchive(path) as results:
+        found = results.lookup(app="phonepe")
+    assert found['source'].value_counts().to_dict() == {'Compare Errors': 2, 'Settlement': 2}
@@ -0,0 +1,45 @@
+from excel_reader import STRING, FLOAT, DATETIME, SheetColumn
+from schema_detect import identify_app, assign_files
+
+# easemytrip and phonepe send the same report layout; only their fallback
+# status columns (TicketStatus, Ticket Status) differ
+SHARED = {'id_col': 'Ticket Id', 'match_col': 'TicketNUmber', 'amount_col': 'TOTAL AMOUNT',
+          'settle_col': 'Settlement Amount', 'date_col': 'Date'}
+CONFIG = {'easemytrip': dict(SHARED), 'phonepe': dict(SHARED)}
+
+
+def report(*names):
+    columns = {
+        'Ticket Id': SheetColumn('Ticket Id', STRING, ['T1']),
+        'TOTAL AMOUNT': SheetColumn('TOTAL AMOUNT', FLOAT, [10]),
+        'Settlement Amount': SheetColumn('Settlement Amount', FLOAT, [9.5]),
+        'Date': SheetColumn('Date', DATETIME, ['2024-01-01']),
+        'Ticket Status': SheetColumn('Ticket Status', STRING, ['SUCCESS']),
+    }
+    return [columns[name] for name in names or columns]
+
+
+def test_named_app_wins_over_a_better_column_score():
+    # The status column scores phonepe higher, yet the file is easemytrip's
+    match = identify_app(report(), CONFIG, "EaseMyTrip jan.xlsx")
+    assert match.app == 'easemytrip'
+    assert identify_app(report(), CONFIG, "phonepe_jan.xlsx").app == 'phonepe'
+
+
+def test_shared_mapping_without_a_name_is_not_guessed():
+    columns = report('Ticket Id', 'TOTAL AMOUNT', 'Settlement Amount', 'Date')
+    assert identify_app(columns, CONFIG, "settlement.xlsx").app is None
+    assert identify_app(columns, CONFIG, "phonepe_jan.xlsx").app == 'phonepe'
+
+
+def test_named_app_whose_columns_do_not_fit_loses_to_columns():
+    columns = report('Ticket Id', 'TOTAL AMOUNT', 'Settlement Amount', 'Ticket Status')
+    assert identify_app(columns, CONFIG, "easemytrip_jan.xlsx").app == 'phonepe'
+
+
+def test_one_file_per_app_sharing_a_mapping_is_assigned():
+    matches = [identify_app(report(), CONFIG, name)._replace(path=name)
+               for name in ["phonepe_jan.xlsx", "easemytrip_jan.xlsx"]]
+    files, problems = assign_files(matches)
+    assert files == {'phonepe': "phonepe_jan.xlsx", 'easemytrip': "easemytrip_jan.xlsx"}
+    assert problems == []
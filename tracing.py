@@ -0,0 +1,99 @@
+"""
+Logging setup and timing spans for the pipelines.
+
+A span logs one line when the work it wraps ends, with its duration and
+any counts attached to it as key=value fields:
+
+    with span(log, "compare", afc_rows=len(afc_df)) as s:
+        ...
+        s.set(errors=len(final_df))
+
+    INFO compare_pipeline: compare done in 3.41s afc_rows=120000 errors=311
+
+The same fields are passed to handlers as record.span, record.elapsed and
+record.fields, so a handler can ship them somewhere structured instead of
+formatting them. Diagnostics that scan whole columns (nunique, value_counts,
+head samples) belong behind debug_enabled() so they cost nothing unless
+debug tracing is on.
+"""
+import logging
+import os
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Default level for configure_logging; DEBUG also turns on the expensive diagnostics
+LOG_LEVEL_ENV = "KOCHIMETRO_LOG_LEVEL"
+
+
+def configure_logging(level=None, fmt=LOG_FORMAT):
+    """
+    Set up the root logger once per process. level falls back to
+    $KOCHIMETRO_LOG_LEVEL, then INFO.
+    """
+    level = level or os.getenv(LOG_LEVEL_ENV) or logging.INFO
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    logging.basicConfig(level=level, format=fmt)
+    logging.getLogger().setLevel(level)
+
+
+def debug_enabled(logger):
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def format_fields(fields):
+    return " ".join(f"{key}={_format_value(value)}" for key, value in fields.items())
+
+
+class Span:
+    """
+    Times a block of work and logs it on exit at the given level; a block
+    that raises is logged at WARNING with the exception type instead.
+    """
+    def __init__(self, logger, name, level=logging.INFO, **fields):
+        self.logger = logger
+        self.name = name
+        self.level = level
+        self.fields = fields
+        self.started_at = None
+        self.elapsed = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.started_at
+        if exc_type is None:
+            emit(self.logger, self.level, self.name, self.elapsed, self.fields, "done")
+        else:
+            emit(self.logger, logging.WARNING, self.name, self.elapsed,
+                 dict(self.fields, error=exc_type.__name__), "failed")
+        return False
+
+
+def span(logger, name, level=logging.INFO, **fields):
+    return Span(logger, name, level, **fields)
+
+
+def emit(logger, level, name, elapsed, fields, outcome="done"):
+    """Log a finished span; shared by Span and ProgressReporter's stage spans."""
+    if not logger.isEnabledFor(level):
+        return
+    message = f"{name} {outcome} in {elapsed:.2f}s"
+    if fields:
+        message += " " + format_fields(fields)
+    logger.log(level, message, extra={"span": name, "elapsed": elapsed, "fields": dict(fields)})
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    text = str(value)
+    return f'"{text}"' if " " in text else text
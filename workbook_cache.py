@@ -0,0 +1,165 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from excel_reader import read_sheet, project
+from sidecar_cache import sidecar_cache
+
+
+class WorkbookCache:
+    """
+    Process-wide cache of parsed worksheets.
+    - Entries are keyed by (path, mtime, size, sheet), so an edited file is
+      re-read automatically
+    - Projected reads (a subset of columns with type hints) are cached under
+      their own key; when the full sheet is already cached they are cut from
+      it instead of parsing the file again
+    - Entries are evicted least-recently-used first once the total in-memory
+      size of the cached DataFrames exceeds max_bytes
+    - Callers always get a copy, so they can add or overwrite columns freely
+      without corrupting the cached frame
+    - Sheets missing from memory are looked up in the on-disk sidecar cache
+      before the workbook itself is parsed, and saved there after parsing
+    """
+    def __init__(self, max_bytes, sidecars=None):
+        self.max_bytes = max_bytes
+        self.sidecars = sidecars
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, threads holding or waiting on it]
+
+    def read_excel(self, path, sheet_name=0, columns=None, dtypes=None):
+        key = self._make_key(path, sheet_name, columns, dtypes)
+
+        # Only one thread parses a given sheet; the others wait and reuse it
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                df = self._get(key)
+                if df is None and (columns is not None or dtypes is not None):
+                    full_df = self._get(key[:4] + (None, None))
+                    if full_df is not None:
+                        df = project(full_df, columns, dtypes)
+                        self._put(key, df)
+                if df is None:
+                    df = self._read_through_sidecar(path, key, sheet_name, columns, dtypes)
+                    self._put(key, df)
+        finally:
+            # The lock goes only once no other thread holds or waits on it,
+            # so a late arrival never gets a fresh one and reads again
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+        return df.copy()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _read_through_sidecar(self, path, key, sheet_name, columns, dtypes):
+        sidecars = self.sidecars
+        if sidecars is None or not sidecars.enabled:
+            return read_sheet(path, sheet_name=sheet_name, columns=columns, dtypes=dtypes)
+
+        # Sidecars are keyed by content, so only the sheet/projection part
+        # of the in-memory key is used
+        df = sidecars.load(path, key[3:])
+        if df is None and (columns is not None or dtypes is not None):
+            full_df = sidecars.load(path, (sheet_name, None, None))
+            if full_df is not None:
+                df = project(full_df, columns, dtypes)
+        if df is None:
+            df = read_sheet(path, sheet_name=sheet_name, columns=columns, dtypes=dtypes)
+            sidecars.save(path, key[3:], df)
+        return df
+
+    def _make_key(self, path, sheet_name, columns=None, dtypes=None):
+        path = os.path.normcase(os.path.abspath(path))
+        stat = os.stat(path)
+        columns_key = tuple(sorted(map(str, columns))) if columns is not None else None
+        dtypes_key = tuple(sorted(dtypes.items())) if dtypes is not None else None
+        return (path, stat.st_mtime_ns, stat.st_size, sheet_name, columns_key, dtypes_key)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            # Drop stale versions of the same sheet before adding the new one
+            for old_key in [k for k in self._entries
+                            if k[0] == key[0] and k[3] == key[3] and k[1:3] != key[1:3]]:
+                self._total_bytes -= self._entries.pop(old_key)[1]
+
+            # A frame larger than the whole budget is never cached
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (df, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+
+# Memory budget for cached workbooks, overridable for low-memory laptops
+CACHE_BUDGET_MB = int(os.getenv("KOCHIMETRO_CACHE_MB", "1024"))
+
+_cache = WorkbookCache(CACHE_BUDGET_MB * 1024 * 1024, sidecar_cache)
+
+# Threads parsing the sheets of one workbook side by side; calamine
+# releases the GIL while it parses a sheet
+SHEET_READ_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def read_excel_cached(path, sheet_name=0, columns=None, dtypes=None):
+    """
+    Parse a worksheet once per session and return a private copy of it.
+    columns and dtypes are passed on to excel_reader.read_sheet.
+    """
+    return _cache.read_excel(path, sheet_name=sheet_name, columns=columns, dtypes=dtypes)
+
+
+def read_sheets_cached(path, sheet_names, progress=None, max_workers=SHEET_READ_WORKERS):
+    """
+    read_excel_cached for several sheets of one workbook, parsed on a thread
+    pool. Returns the frames in sheet_names order. progress.advance() is
+    called from the calling thread as each sheet arrives, so a cancelled
+    job stops waiting and the sheets not started yet are dropped.
+    """
+    frames = [None] * len(sheet_names)
+    if len(sheet_names) <= 1 or max_workers <= 1:
+        for i, sheet_name in enumerate(sheet_names):
+            frames[i] = read_excel_cached(path, sheet_name=sheet_name)
+            if progress is not None:
+                progress.advance()
+        return frames
+
+    # Every read opens its own handle: calamine workbooks cannot be shared
+    # between threads, and opening one costs next to nothing
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(sheet_names)))
+    try:
+        futures = {executor.submit(read_excel_cached, path, sheet_name=sheet_name): i
+                   for i, sheet_name in enumerate(sheet_names)}
+        for future in as_completed(futures):
+            frames[futures[future]] = future.result()
+            if progress is not None:
+                progress.advance()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return frames
+
+
+def clear_cache():
+    _cache.clear()
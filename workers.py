@@ -0,0 +1,85 @@
+import logging
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from progress import ProgressReporter
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a running job once the user has asked to cancel it.
+    Derives from BaseException so the per-app `except Exception` handlers in
+    the pipelines do not swallow it.
+    """
+
+
+class WorkerSignals(QObject):
+    """
+    Signals emitted by a Worker. They are delivered on the GUI thread, so
+    slots connected to them may touch widgets directly.
+    """
+    progress = pyqtSignal(object)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Runs fn(*args, job=self, **kwargs) on the global QThreadPool.
+    - The job function reports progress through job.progress, a
+      ProgressReporter whose updates are emitted as ProgressUpdate objects
+    - Every progress report is also a cancellation point; the job function
+      may call job.check_cancelled() between reports as well
+    - Exactly one of result/error/cancelled is emitted, followed by finished
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancel_event = threading.Event()
+        self.progress = ProgressReporter(callback=self._emit_progress)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def _emit_progress(self, update):
+        self.check_cancelled()
+        self.signals.progress.emit(update)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(*self.args, job=self, **self.kwargs)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            logging.error(f"Background job failed:\n{traceback.format_exc()}")
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+# Keep a reference to every running worker so its signals object is not
+# garbage collected before the job reports back
+_active_workers = set()
+
+
+def start_job(worker):
+    """Queue a Worker on the global thread pool and return it."""
+    _active_workers.add(worker)
+    worker.signals.finished.connect(lambda: _active_workers.discard(worker))
+    QThreadPool.globalInstance().start(worker)
+    return worker
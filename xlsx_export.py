@@ -0,0 +1,121 @@
+from collections import namedtuple
+from itertools import chain, islice
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+
+# One worksheet to export.
+# - action_options: list values for a dropdown on the last ("Action") column
+# - auto_width: size columns from the header and the first WIDTH_SAMPLE_ROWS rows
+SheetSpec = namedtuple("SheetSpec", ["name", "df", "action_options", "auto_width"])
+SheetSpec.__new__.__defaults__ = (None, False)
+
+# A worksheet whose rows are produced one at a time, for outputs too large
+# to hold as a DataFrame.
+# - rows: iterable of cell-value sequences, e.g. from frame_rows()
+# - auto_width: uses the first WIDTH_SAMPLE_ROWS rows, as for SheetSpec
+StreamSheetSpec = namedtuple("StreamSheetSpec", ["name", "columns", "rows", "action_options", "auto_width"])
+StreamSheetSpec.__new__.__defaults__ = (None, False)
+
+WIDTH_SAMPLE_ROWS = 1000
+MAX_COLUMN_WIDTH = 50
+CHUNK_ROWS = 50000
+
+# Same header look as pandas' openpyxl writer
+_HEADER_FONT = Font(bold=True)
+_HEADER_BORDER = Border(*(Side(style="thin"),) * 4)
+_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def write_workbook(path, sheets, progress=None):
+    """
+    Stream DataFrames into an .xlsx file with openpyxl's write-only mode.
+
+    Column widths and the Action dropdown are computed from the DataFrames
+    and written together with the rows, so the file is written exactly once
+    and never loaded back. progress.advance() is called per chunk of rows.
+    sheets may mix SheetSpec and StreamSheetSpec.
+    """
+    workbook = Workbook(write_only=True)
+    for spec in sheets:
+        _write_sheet(workbook, spec, progress)
+    workbook.save(path)
+
+
+def frame_rows(df):
+    """Yield the rows of df as tuples of plain cell values, converting CHUNK_ROWS rows at a time."""
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        columns = [_to_cell_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        yield from zip(*columns)
+
+
+def _write_sheet(workbook, spec, progress):
+    sheet = workbook.create_sheet(spec.name)
+    if isinstance(spec, SheetSpec):
+        if spec.df.shape[1] == 0:
+            return
+        columns, rows = list(spec.df.columns), frame_rows(spec.df)
+    else:
+        columns, rows = list(spec.columns), iter(spec.rows)
+
+    # Column settings have to be in place before the first row is written
+    if spec.auto_width:
+        sample = list(islice(rows, WIDTH_SAMPLE_ROWS - 1))
+        for index, width in enumerate(_column_widths(columns, sample), start=1):
+            sheet.column_dimensions[get_column_letter(index)].width = width
+        rows = chain(sample, rows)
+
+    header = []
+    for name in columns:
+        cell = WriteOnlyCell(sheet, value=str(name))
+        cell.font = _HEADER_FONT
+        cell.border = _HEADER_BORDER
+        cell.alignment = _HEADER_ALIGNMENT
+        header.append(cell)
+    sheet.append(header)
+
+    row_count = 0
+    for row in rows:
+        sheet.append(row)
+        row_count += 1
+        if progress is not None and row_count % CHUNK_ROWS == 0:
+            progress.advance(CHUNK_ROWS)
+    if progress is not None and row_count % CHUNK_ROWS:
+        progress.advance(row_count % CHUNK_ROWS)
+
+    # Validations are written when the sheet is closed, so the range can
+    # be set once the number of rows is known
+    if spec.action_options:
+        validation = DataValidation(
+            type="list",
+            formula1=f'"{",".join(spec.action_options)}"',
+            allow_blank=True
+        )
+        action_column = get_column_letter(len(columns))
+        validation.add(f"{action_column}2:{action_column}{row_count + 1}")
+        sheet.data_validations.append(validation)
+
+
+def _to_cell_values(series):
+    """Convert a column to plain Python values, with None for missing cells."""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        # Excel has no notion of time zones
+        series = series.dt.tz_localize(None)
+
+    values = series.astype(object).to_numpy(copy=True)
+    values[series.isna().to_numpy()] = None
+    return values.tolist()
+
+
+def _column_widths(columns, sample_rows):
+    widths = []
+    for i, name in enumerate(columns):
+        lengths = [len(str(name))]
+        lengths.extend(len(str(row[i])) for row in sample_rows if row[i] is not None)
+        widths.append(min(max(lengths) + 2, MAX_COLUMN_WIDTH))
+    return widths